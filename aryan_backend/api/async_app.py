@@ -0,0 +1,337 @@
+"""
+ASGI variant of the Mongo recommender (index.py) on Quart and the Motor async driver.
+
+GET /recommend_cities keeps the response schema, ETags and result cache of index.py,
+but MongoDB round trips never block the worker:
+- on a cold start the user lookup runs while the users and trips collections load concurrently
+- group members missing from the snapshot are fetched with concurrent $in queries,
+  once for all three groups
+- the age, co-visitation and same-city groups are scored in parallel on a thread pool;
+  only the cheap exclusion and ranking step runs in order, so results match index.py
+
+MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_MAX_IDLE_TIME_MS and
+MONGO_WAIT_QUEUE_TIMEOUT_MS configure the connection pool; STRATEGY_THREADS sizes
+the scoring pool. The batch, export, trending and debug endpoints stay on index.py.
+
+Run (from aryan_backend/, with requirements-async.txt installed):
+    PYTHONPATH=.:api hypercorn async_app:app --workers 4 --bind 0.0.0.0:5002
+"""
+import asyncio
+import contextvars
+import os
+import time
+from collections import ChainMap
+from concurrent.futures import ThreadPoolExecutor
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from quart import Quart, Response, g, jsonify, request
+
+import index
+from index import (
+    DB_NAME, IN_QUERY_BATCH_SIZE, MONGO_URI, TRIPS_COLLECTION, USER_PLACE_FIELDS, USERS_COLLECTION,
+    DataSnapshot, age_group_ids, city_group_ids, clean_documents, co_visitation_group, data_version_token,
+    finish_recommendations, get_all_user_places, get_recently_visited_places,
+    get_recommendations_from_group, group_place_scores, lookup_precomputed, normalize_place,
+    result_cache,
+)
+from instrumentation import debug, log, registry, request_seconds, sample_debug, stage
+from result_cache import make_etag
+
+# --- Constants ---
+MONGO_POOL_OPTIONS = {
+    "maxPoolSize": int(os.environ.get("MONGO_MAX_POOL_SIZE", "100")),
+    "minPoolSize": int(os.environ.get("MONGO_MIN_POOL_SIZE", "0")),
+    "maxIdleTimeMS": int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", "60000")),
+    "waitQueueTimeoutMS": int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000")),
+}
+STRATEGY_THREADS = int(os.environ.get("STRATEGY_THREADS", "4"))
+AGE_WINDOW = 5
+
+app = Quart(__name__)
+strategy_pool = ThreadPoolExecutor(max_workers=STRATEGY_THREADS, thread_name_prefix="strategy")
+client = None
+db = None
+
+# --- Database Connection ---
+@app.before_serving
+async def connect():
+    """One client per worker process, created on its event loop."""
+    global client, db
+    client = AsyncIOMotorClient(MONGO_URI, serverSelectionTimeoutMS=5000, **MONGO_POOL_OPTIONS)
+    db = client[DB_NAME]
+
+@app.after_serving
+async def disconnect():
+    client.close()
+
+def run_blocking(fn, *args):
+    """fn(*args) on the strategy pool, in a copy of the caller's context (run_in_executor
+    does not copy it), so the request's debug sampling applies to the work there too."""
+    context = contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(strategy_pool, context.run, fn, *args)
+
+# --- Async Data Fetching ---
+async def fetch_all(collection_name, id_fields, to_lowercase_fields=[]):
+    try:
+        data = await db[collection_name].find({}).to_list(None)
+    except Exception as e:
+        log.error("Error fetching data from %s: %s", collection_name, e)
+        data = []
+    index.mongo_round_trips.inc("find")
+    index.mongo_documents.inc(collection_name, amount=len(data))
+    return await run_blocking(clean_documents, data, id_fields, to_lowercase_fields)
+
+async def fetch_data_version():
+    """Same token as index.fetch_data_version, with all four queries in flight at once."""
+    queries = []
+    for name in (USERS_COLLECTION, TRIPS_COLLECTION):
+        queries.append(db[name].estimated_document_count())
+        queries.append(db[name].find_one({}, {"updatedAt": 1}, sort=[("updatedAt", -1)]))
+    results = await asyncio.gather(*queries)
+    index.mongo_round_trips.inc("count", amount=2)
+    index.mongo_round_trips.inc("find_one", amount=2)
+    return data_version_token([(results[0], results[1]), (results[2], results[3])])
+
+async def load_snapshot_version():
+    """fetch_data_version, or a time-based token when it fails, as in index.load_snapshot."""
+    try:
+        return await fetch_data_version()
+    except Exception as e:
+        log.error("Error fetching data version: %s", e)
+        return f"t{int(time.time())}"
+
+async def load_snapshot():
+    users_df, trips_df, version = await asyncio.gather(
+        fetch_all(USERS_COLLECTION, id_fields=['_id'], to_lowercase_fields=['city']),
+        fetch_all(TRIPS_COLLECTION, id_fields=['_id', 'user_id']),
+        load_snapshot_version(),
+    )
+    return await run_blocking(DataSnapshot, users_df, trips_df, version)
+
+async def get_user_by_id(user_oid):
+    try:
+        user = await db[USERS_COLLECTION].find_one({"_id": user_oid})
+    except Exception as e:
+        log.error("Error fetching user by ID %s: %s", user_oid, e)
+        return None
+    index.mongo_round_trips.inc("find_one")
+    if user:
+        index.mongo_documents.inc(USERS_COLLECTION)
+        user['_id'] = str(user['_id'])
+    return user
+
+async def fetch_user_docs(user_ids):
+    """{user_id: place-field doc or None} for the given ids, one concurrent $in query per batch."""
+    docs = dict.fromkeys(user_ids)
+    oids = [ObjectId(user_id) for user_id in user_ids if ObjectId.is_valid(user_id)]
+    projection = {field: 1 for field in USER_PLACE_FIELDS}
+    try:
+        batches = await asyncio.gather(*(
+            db[USERS_COLLECTION].find({"_id": {"$in": oids[start:start + IN_QUERY_BATCH_SIZE]}}, projection)
+            .to_list(None)
+            for start in range(0, len(oids), IN_QUERY_BATCH_SIZE)
+        ))
+    except Exception as e:
+        log.error("Error fetching users in bulk: %s", e)
+        return docs
+    for batch in batches:
+        index.mongo_round_trips.inc("find")
+        index.mongo_documents.inc(USERS_COLLECTION, amount=len(batch))
+        for doc in batch:
+            doc['_id'] = str(doc['_id']).strip().lower()
+            docs[doc['_id']] = doc
+    return docs
+
+# --- Data Snapshot Cache ---
+class AsyncSnapshotCache:
+    """
+    Event-loop counterpart of index.SnapshotCache.
+    - The first load is awaited; afterwards readers always get the current snapshot at once.
+    - At most every poll_seconds a background task compares the data version and reloads
+      when it changed or the snapshot is older than ttl_seconds.
+    """
+
+    def __init__(self, ttl_seconds, poll_seconds):
+        self.ttl_seconds = ttl_seconds
+        self.poll_seconds = poll_seconds
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = None
+        self._refresh_task = None
+
+    @property
+    def ready(self):
+        return self._snapshot is not None
+
+    async def get(self):
+        if self._snapshot is None:
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = await load_snapshot()
+                    self._checked_at = time.time()
+        elif time.time() - self._checked_at > self.poll_seconds and self._refresh_task is None:
+            self._checked_at = time.time()
+            self._refresh_task = asyncio.create_task(self._refresh())
+        return self._snapshot
+
+    async def _refresh(self):
+        try:
+            version = await fetch_data_version()
+            snapshot = self._snapshot
+            if version != snapshot.data_version or time.time() - snapshot.loaded_at > self.ttl_seconds:
+                self._snapshot = await load_snapshot()
+        except Exception as e:
+            log.error("Error refreshing data snapshot: %s", e)
+        finally:
+            self._refresh_task = None
+
+snapshot_cache = AsyncSnapshotCache(
+    ttl_seconds=index.SNAPSHOT_TTL_SECONDS, poll_seconds=index.SNAPSHOT_POLL_SECONDS
+)
+
+# --- Recommendations ---
+async def compute_recommendations(user, snapshot, top_n=7):
+    """
+    index.compute_recommendations with the groups' documents prefetched and their place
+    scores computed concurrently; the ranking that chains exclusions runs in order.
+    """
+    users_df = snapshot.users_df
+    trips_df = snapshot.trips_df
+
+    user['_id'] = str(user['_id']).strip().lower()
+    user_id = user['_id']
+    user_age = user.get('age')
+    user_city = normalize_place(user.get('city', ''))
+    user_visited_places = get_all_user_places(user)
+    doc_cache = ChainMap({user_id: user}, snapshot.user_docs)
+    debug(
+        "Recommending for user %s: age=%s city=%s recent=%s visited=%s",
+        user_id, user_age, user_city,
+        normalize_place(get_recently_visited_places(user, trips_df) or ''), user_visited_places
+    )
+
+    weights = {}
+
+    def build_groups():
+        groups = {}
+        if users_df.empty:
+            return groups
+        if user_age is not None:
+            groups['age'] = age_group_ids(snapshot, user_age, AGE_WINDOW)
+        if user_visited_places and snapshot.cooccurrence is None:
+            try:
+                groups['co_visitation'], weights['co_visitation'] = co_visitation_group(
+                    snapshot, user_id, user_visited_places
+                )
+            except Exception as e:
+                log.warning("Error finding co-visitors: %s", e)
+        if user_city:
+            groups['city'] = city_group_ids(snapshot, user_city)
+        return {name: [i for i in ids if i != user_id] for name, ids in groups.items()}
+
+    groups = await run_blocking(build_groups)
+
+    # Members added since the snapshot was built: one round of concurrent queries for all groups
+    missing = {i for ids in groups.values() for i in ids if i not in doc_cache}
+    if missing:
+        doc_cache.maps[0].update(await fetch_user_docs(list(missing)))
+
+    async def score(name, ids):
+        with stage(f"strategy_{name}"):
+            return name, await run_blocking(group_place_scores, ids, trips_df, doc_cache, weights.get(name))
+
+    scores = dict(await asyncio.gather(*(score(name, ids) for name, ids in groups.items() if ids)))
+
+    sections = []
+    exclude = list(user_visited_places)
+    for name in ('age', 'co_visitation', 'city'):
+        places = []
+        if name == 'co_visitation' and snapshot.cooccurrence is not None:
+            if user_visited_places and not users_df.empty:
+                with stage("strategy_co_visitation"):
+                    places = await run_blocking(
+                        snapshot.cooccurrence.rank_places, user_visited_places, exclude, top_n
+                    )
+        elif scores.get(name) is not None:
+            places = get_recommendations_from_group(
+                user_id, groups[name], trips_df, top_n=top_n, exclude_places=exclude,
+                doc_cache=doc_cache, group_scores=scores[name]
+            )
+        sections.append(places)
+        exclude = exclude + places
+
+    return finish_recommendations(*sections, user_visited_places, snapshot.popularity, user_city)
+
+# --- Routes ---
+@app.before_request
+async def start_request():
+    g.request_started = time.perf_counter()
+    sample_debug()
+
+@app.after_request
+async def finish_request(response):
+    started = getattr(g, "request_started", None)
+    if started is not None:
+        request_seconds.observe(
+            time.perf_counter() - started, request.url_rule.rule if request.url_rule else "unmatched",
+            response.status_code
+        )
+    return response
+
+@app.route('/recommend_cities', methods=['GET'])
+async def recommend_cities_route():
+    user_oid_str = request.args.get('id', '').strip().lower()
+    if not user_oid_str:
+        return jsonify({"error": "Missing user ID parameter"}), 400
+    if not ObjectId.is_valid(user_oid_str):
+        return jsonify({"error": "Invalid user ID format"}), 400
+    user_oid = ObjectId(user_oid_str)
+
+    # A cold start overlaps the user lookup with the snapshot load
+    user_task = None if snapshot_cache.ready else asyncio.create_task(get_user_by_id(user_oid))
+    try:
+        top_n = 7
+        with stage("data_fetch"):
+            snapshot = await snapshot_cache.get()
+        etag = make_etag(snapshot.version, user_oid_str, top_n)
+        if request.if_none_match.contains(etag):
+            response = Response("", status=304)
+            response.set_etag(etag)
+            return response
+
+        cache_key = (user_oid_str, top_n, snapshot.version)
+        result = result_cache.get(cache_key)
+        if result is None:
+            with stage("user_lookup"):
+                user = await (user_task or get_user_by_id(user_oid))
+                user_task = None
+            if user is None:
+                return jsonify({"error": "User ID not found"}), 404
+            with stage("precomputed_lookup"):
+                result = lookup_precomputed(user_oid_str, snapshot, snapshot.version, top_n=top_n)
+            if result is None:
+                result = await compute_recommendations(user, snapshot, top_n=top_n)
+            result_cache.put(cache_key, result)
+    finally:
+        if user_task is not None:
+            user_task.cancel()
+
+    with stage("serialization"):
+        response = jsonify(result)
+    response.set_etag(etag)
+    return response
+
+@app.route('/', methods=["GET"])
+async def home():
+    return 'Hello from the async recommendation backend!'
+
+@app.route('/cache_stats', methods=['GET'])
+async def cache_stats():
+    return jsonify(result_cache.stats())
+
+@app.route('/metrics', methods=['GET'])
+async def metrics():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
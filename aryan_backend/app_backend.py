@@ -1,124 +1,252 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+from contextlib import contextmanager
+import math
+import os
+import signal
+import threading
+import time
+import numpy as np
 import pandas as pd
-from collections import defaultdict
+from columnar_store import META_FILE, csv_data_version, load_columnar, parse_amounts
+from cooccurrence import PlaceCooccurrence
+from ingest import (
+    Snapshot, append_csv_rows, locked_file, parse_trips, parse_users, read_appended, trips_from_frame,
+    users_from_frame,
+)
+from lookup_index import LookupIndex, normalize_place
+from materialize import PrecomputedStore
+from place_stats import PlaceStats
+from trending import TrendingCounters
+from result_cache import ResultCache, make_etag
+from instrumentation import cache_collector, configure_logging, install, log, registry, stage
+from scoring import rank_group_places
 
 app = Flask(__name__)
+configure_logging()
+install(app)
 
 # Load data on startup
-USERS_FILE = "data/users.csv"
-TRIPS_FILE = "data/trips.csv"
-users_df = pd.read_csv(USERS_FILE)
-trips_df = pd.read_csv(TRIPS_FILE)
-
-# Normalize places
-def normalize_place(s):
-    return str(s).strip().lower()
-
-# Recency weight function
-def recency_weight(date_str, min_date, max_date):
-    if pd.isna(date_str):
-        return 0.0
-    try:
-        d = pd.to_datetime(date_str)
-        return (d - min_date).days / max((max_date - min_date).days, 1)
-    except Exception:
-        return 0.0
-
-def get_user_record(user_id):
-    user = users_df[users_df['user_id'] == user_id]
-    if user.empty:
-        return None
-    return user.iloc[0]
+USERS_FILE = os.environ.get("USERS_FILE", "data/users.csv")
+TRIPS_FILE = os.environ.get("TRIPS_FILE", "data/trips.csv")
+DEFAULT_AGE_WINDOW = 5
+MAX_BATCH_USERS = 10000
+BATCH_CHUNK_SIZE = 500
+# /recommend_cities/export: users scored per chunk (the first chunk holds one, so output starts
+# at once) and ids scanned per step while looking for users that pass the filters
+EXPORT_CHUNK_SIZE = 500
+EXPORT_SCAN_SIZE = 10000
+# Directory written by columnar_store.py; when set, data is memory-mapped from it instead of parsing the CSVs
+COLUMNAR_DIR = os.environ.get("COLUMNAR_DIR")
+# Directory written by materialize.py; when set, /recommend_cities serves from it
+PRECOMPUTED_DIR = os.environ.get("PRECOMPUTED_DIR")
+# The data files are checked for changes made outside this process before each request and,
+# while none arrive, every RELOAD_POLL_SECONDS seconds; 0 disables both
+RELOAD_POLL_SECONDS = float(os.environ.get("RELOAD_POLL_SECONDS", "10"))
+# Co-visitation section: "recent_place" (users sharing the recently visited place) or
+# "cooccurrence" (places most co-visited with the user's own, from a sparse place x place matrix)
+COVISIT_MODE = os.environ.get("COVISIT_MODE", "recent_place")
+# Half-life of a visit's weight in the co-occurrence matrix
+COOCCURRENCE_HALF_LIFE_DAYS = float(os.environ.get("COOCCURRENCE_HALF_LIFE_DAYS", "365"))
+# /trending: windows in days, decay half-life as a share of the window, age band width, places per window
+TRENDING_WINDOWS = [int(w) for w in os.environ.get("TRENDING_WINDOWS", "30,90,365").split(",")]
+TRENDING_HALF_LIFE_FRACTION = float(os.environ.get("TRENDING_HALF_LIFE_FRACTION", "0.25"))
+TRENDING_AGE_BAND_YEARS = int(os.environ.get("TRENDING_AGE_BAND_YEARS", "10"))
+TRENDING_TOP_N = 10
+MAX_TRENDING_TOP_N = 100
+
+def watched_files():
+    return [os.path.join(COLUMNAR_DIR, META_FILE)] if COLUMNAR_DIR else [USERS_FILE, TRIPS_FILE]
+
+def source_version():
+    return csv_data_version(*watched_files())
+
+def file_positions():
+    """(inode, size) of each data file: where reading rows appended later starts."""
+    return [(s.st_ino, s.st_size) for s in map(os.stat, watched_files())]
+
+@contextmanager
+def data_files_locked():
+    """
+    Holds the CSVs' append locks, so what a load, catch-up or ingest reads or writes ends
+    at the positions it records; yields {path: open file}.
+    """
+    if COLUMNAR_DIR:
+        yield {}
+        return
+    with locked_file(USERS_FILE) as users_file, locked_file(TRIPS_FILE) as trips_file:
+        yield {USERS_FILE: users_file, TRIPS_FILE: trips_file}
+
+def places_visited_entries(values):
+    """(user row, normalized place) pairs of a places_visited column, split like the columnar store does."""
+    rows, places = [], []
+    for row, raw in enumerate(values):
+        if not pd.isna(raw):
+            for place in str(raw).split(','):
+                if place.strip():
+                    rows.append(row)
+                    places.append(normalize_place(place))
+    return rows, places
+
+def place_stats_of(index, durations, budgets):
+    """PlaceStats over the index's trips; negative durations and budgets are unknown."""
+    durations = np.asarray(durations, dtype=float)
+    budgets = np.asarray(budgets, dtype=float)
+    return PlaceStats(
+        index.place_codes, np.where(durations >= 0, durations, np.nan), np.where(budgets >= 0, budgets, np.nan),
+        index.end_days, index.has_end_date, len(index.place_names),
+    )
+
+def trending_of(index):
+    """TrendingCounters over the index's trips, faceted by their users' normalized city and age."""
+    rows = index.trip_user_rows
+    known = rows >= 0
+    # City code -1 (unknown) picks the trailing ""
+    city_names = np.asarray([normalize_place(city) for city in index.city_names] + [""], dtype=object)
+    return TrendingCounters.build(
+        index.place_names[index.place_codes], index.end_days, index.has_end_date,
+        np.where(known, city_names[index.user_cities[rows]], ""), np.where(known, index.ages[rows], np.nan),
+        windows=TRENDING_WINDOWS, half_life_fraction=TRENDING_HALF_LIFE_FRACTION,
+        age_band_years=TRENDING_AGE_BAND_YEARS,
+    )
 
-def get_places_by_similar_age(user_id, window=5, top_n=5, exclude=[]):
-    user = get_user_record(user_id)
+def load_snapshot():
+    """Builds a snapshot of the data; parsed CSV frames are not kept once the index exists."""
+    if COLUMNAR_DIR:
+        columnar = load_columnar(COLUMNAR_DIR)
+        index = LookupIndex.from_columnar(columnar)
+        place_stats = place_stats_of(index, columnar.trips["duration"], columnar.trips["budget"])
+        cooccurrence = None
+        if COVISIT_MODE == "cooccurrence":
+            offsets = columnar.users["places_offsets"]
+            visited_rows = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+            visited_places = np.asarray(columnar.places, dtype=object)[columnar.users["places_values"]]
+            cooccurrence = PlaceCooccurrence.from_index(index, visited_rows, visited_places, COOCCURRENCE_HALF_LIFE_DAYS)
+        return Snapshot(index, columnar.meta["data_version"], place_stats, trending_of(index), cooccurrence)
+    users_df = pd.read_csv(USERS_FILE)
+    trips_df = pd.read_csv(TRIPS_FILE)
+    index = LookupIndex.from_frames(users_df, trips_df)
+    missing = pd.Series(np.nan, index=trips_df.index)
+    place_stats = place_stats_of(
+        index,
+        pd.to_numeric(trips_df.get('duration_of_visit', missing), errors='coerce'),
+        parse_amounts(trips_df.get('overall_budget', missing)),
+    )
+    cooccurrence = None
+    if COVISIT_MODE == "cooccurrence":
+        visited_rows, visited_places = places_visited_entries(
+            users_df['places_visited'] if 'places_visited' in users_df else []
+        )
+        cooccurrence = PlaceCooccurrence.from_index(index, visited_rows, visited_places, COOCCURRENCE_HALF_LIFE_DAYS)
+    return Snapshot(index, csv_data_version(USERS_FILE, TRIPS_FILE), place_stats, trending_of(index), cooccurrence)
+
+# Requests read the snapshot reference once and hold its read lock; ingest updates it in
+# place under the write lock and a reload replaces the reference
+with data_files_locked():
+    loaded_source_version = source_version()
+    loaded_positions = file_positions()
+    snapshot = load_snapshot()
+ingest_lock = threading.Lock()
+precomputed = PrecomputedStore(PRECOMPUTED_DIR) if PRECOMPUTED_DIR else None
+
+result_cache = ResultCache(
+    max_entries=int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "10000")),
+    ttl_seconds=float(os.environ.get("RESULT_CACHE_TTL_SECONDS", "600")),
+)
+registry.collector(cache_collector("result_cache", result_cache))
+
+def get_user_record(user_id, snap=None):
+    return (snap or snapshot).index.user(user_id)
+
+def get_places_by_similar_age(user_id, window=DEFAULT_AGE_WINDOW, top_n=5, exclude=[], snap=None, allowed=None):
+    snap = snap or snapshot
+    index, age_histograms = snap.index, snap.age_histograms
+    user = index.user(user_id)
     if user is None:
         return []
-    age_low, age_high = user.age - window, user.age + window
-    similar_users = users_df[
-        (users_df.age >= age_low) &
-        (users_df.age <= age_high) &
-        (users_df.user_id != user_id)
-    ]
-    sim_user_ids = similar_users.user_id.tolist()
-    group_trips = trips_df[trips_df.user_id.isin(sim_user_ids)].copy()
-    group_trips["place_norm"] = group_trips["place_of_visit"].apply(normalize_place)
-    if group_trips.empty:
+    if pd.isna(user.age):
         return []
-    min_date = pd.to_datetime(group_trips["end_date"]).min()
-    max_date = pd.to_datetime(group_trips["end_date"]).max()
-    group_trips["recency"] = group_trips["end_date"].apply(lambda d: recency_weight(d, min_date, max_date))
-    visited_by_user = trips_df[trips_df.user_id == user_id]['place_of_visit'].apply(normalize_place).unique()
-    place_scores = defaultdict(float)
-    for _, row in group_trips.iterrows():
-        p = row["place_norm"]
-        if p not in visited_by_user and p not in exclude:
-            place_scores[p] += 1.0 + row["recency"]
-    ranked = sorted(place_scores.items(), key=lambda x: -x[1])
-    return [x[0] for x in ranked[:top_n]]
-
-def get_places_by_recent_visit(user_id, top_n=5, exclude=[]):
-    user = get_user_record(user_id)
+    age_low, age_high = user.age - window, user.age + window
+    excluded = index.visited_places(user_id).union(exclude)
+    if age_histograms is not None:
+        ranked = age_histograms.rank(
+            index, int(age_low) - age_histograms.base, int(age_high) - age_histograms.base,
+            user_id, True, excluded, top_n, allowed
+        )
+        if ranked is not None:
+            return ranked
+    sim_user_ids = [uid for uid in index.users_in_age_range(age_low, age_high) if uid != user_id]
+    group_trips = index.trip_positions(sim_user_ids)
+    return rank_group_places(index, group_trips, excluded, top_n, allowed)
+
+def get_places_by_recent_visit(user_id, top_n=5, exclude=[], snap=None, allowed=None):
+    snap = snap or snapshot
+    index = snap.index
+    user = index.user(user_id)
     if user is None:
         return []
     recent_place = normalize_place(user.recently_visited_place)
-    similar_visitors = users_df[
-        users_df['recently_visited_place'].apply(normalize_place) == recent_place
-    ]
-    sim_ids = similar_visitors.user_id.tolist()
-    group_trips = trips_df[trips_df.user_id.isin(sim_ids)].copy()
-    if group_trips.empty:
+    excluded = index.visited_places(user_id).union(exclude, [recent_place])
+    # The group includes the user, so nothing is subtracted
+    recent_code = index.user_recent[index.row(user_id)]
+    return snap.recent_histograms.rank(index, recent_code, recent_code, user_id, False, excluded, top_n, allowed)
+
+def get_places_by_cooccurrence(user_id, top_n=5, exclude=[], snap=None, allowed=None):
+    snap = snap or snapshot
+    index = snap.index
+    user = index.user(user_id)
+    if user is None:
         return []
-    group_trips["place_norm"] = group_trips["place_of_visit"].apply(normalize_place)
-    min_date = pd.to_datetime(group_trips["end_date"]).min()
-    max_date = pd.to_datetime(group_trips["end_date"]).max()
-    group_trips["recency"] = group_trips["end_date"].apply(lambda d: recency_weight(d, min_date, max_date))
-    visited_by_user = trips_df[trips_df.user_id == user_id]['place_of_visit'].apply(normalize_place).unique()
-    place_scores = defaultdict(float)
-    for _, row in group_trips.iterrows():
-        p = row["place_norm"]
-        if p != recent_place and p not in visited_by_user and p not in exclude:
-            place_scores[p] += 1.0 + row["recency"]
-    ranked = sorted(place_scores.items(), key=lambda x: -x[1])
-    return [x[0] for x in ranked[:top_n]]
-
-def get_places_by_city(user_id, top_n=5, exclude=[]):
-    user = get_user_record(user_id)
+    recent_place = normalize_place(user.recently_visited_place)
+    excluded = index.visited_places(user_id).union(exclude, [recent_place])
+    # The matrix has its own place codes, so the mask goes over as names
+    allowed_places = None if allowed is None else index.place_names[:len(allowed)][allowed].tolist()
+    return snap.cooccurrence.rank_user(index.row(user_id), excluded, top_n, allowed_places)
+
+def get_places_by_city(user_id, top_n=5, exclude=[], snap=None, allowed=None):
+    snap = snap or snapshot
+    index = snap.index
+    user = index.user(user_id)
     if user is None:
         return []
     city = user.city_of_residence
-    same_city_users = users_df[(users_df.city_of_residence == city) & (users_df.user_id != user_id)]
-    city_ids = same_city_users.user_id.tolist()
-    group_trips = trips_df[trips_df.user_id.isin(city_ids)].copy()
-    if group_trips.empty:
+    if city is None:
         return []
-    group_trips["place_norm"] = group_trips["place_of_visit"].apply(normalize_place)
-    min_date = pd.to_datetime(group_trips["end_date"]).min()
-    max_date = pd.to_datetime(group_trips["end_date"]).max()
-    group_trips["recency"] = group_trips["end_date"].apply(lambda d: recency_weight(d, min_date, max_date))
-    visited_by_user = trips_df[trips_df.user_id == user_id]['place_of_visit'].apply(normalize_place).unique()
-    place_scores = defaultdict(float)
-    for _, row in group_trips.iterrows():
-        p = row["place_norm"]
-        if p not in visited_by_user and p not in exclude:
-            place_scores[p] += 1.0 + row["recency"]
-    ranked = sorted(place_scores.items(), key=lambda x: -x[1])
-    return [x[0] for x in ranked[:top_n]]
+    excluded = index.visited_places(user_id).union(exclude)
+    city_code = index.user_cities[index.row(user_id)]
+    ranked = snap.city_histograms.rank(index, city_code, city_code, user_id, True, excluded, top_n, allowed)
+    if ranked is not None:
+        return ranked
+    city_ids = [uid for uid in index.users_in_city(city) if uid != user_id]
+    group_trips = index.trip_positions(city_ids)
+    return rank_group_places(index, group_trips, excluded, top_n, allowed)
 
-@app.route('/recommend_cities', methods=['GET'])
-def recommend_cities():
-    user_id_str = request.args.get('user_id')
-    if user_id_str is None or not user_id_str.isdigit():
-        return jsonify({"error": "Missing or invalid user_id parameter"}), 400
-    user_id = int(user_id_str)
-    user = get_user_record(user_id)
-    if user is None:
-        return jsonify({"error": "User ID not found"}), 404
-    top_n = 5
-    sec1 = get_places_by_similar_age(user_id, top_n=top_n, exclude=[])
-    sec2 = get_places_by_recent_visit(user_id, top_n=top_n, exclude=sec1)
-    sec3 = get_places_by_city(user_id, top_n=top_n, exclude=sec1 + sec2)
-    result = {
+def lookup_precomputed(user_id, top_n=5, snap=None):
+    """Payload from the materialized store, or None for users built after it, a store built from other data, or no store."""
+    if precomputed is None or precomputed.meta["top_n"] != top_n:
+        return None
+    if precomputed.meta["data_version"] != (snap or snapshot).data_version:
+        return None
+    recs = precomputed.lookup(user_id)
+    if recs is None:
+        return None
+    return {"user": {"recommendations": recs}}
+
+def build_recommendations(user_id, top_n=5, window=DEFAULT_AGE_WINDOW, snap=None, allowed=None):
+    """
+    Callers serving requests pass the snapshot whose read lock they hold.
+    allowed (a mask over place codes, see PlaceStats.allowed) restricts every section.
+    """
+    snap = snap or snapshot
+    with stage("strategy_age"):
+        sec1 = get_places_by_similar_age(user_id, window=window, top_n=top_n, exclude=[], snap=snap, allowed=allowed)
+    with stage("strategy_co_visitation"):
+        if snap.cooccurrence is not None:
+            sec2 = get_places_by_cooccurrence(user_id, top_n=top_n, exclude=sec1, snap=snap, allowed=allowed)
+        else:
+            sec2 = get_places_by_recent_visit(user_id, top_n=top_n, exclude=sec1, snap=snap, allowed=allowed)
+    with stage("strategy_city"):
+        sec3 = get_places_by_city(user_id, top_n=top_n, exclude=sec1 + sec2, snap=snap, allowed=allowed)
+    return {
         "user": {
         "recommendations": {
             "similar_age_group": sec1,
@@ -126,7 +254,406 @@ def recommend_cities():
             "same_city": sec3
         }}
     }
-    return jsonify(result)
+
+def optional_number(name, parse=float):
+    """
+    Query parameter as a number, None when absent; raises ValueError when invalid. Every
+    numeric parameter is a count, id or amount, so nan, inf and negatives are invalid too.
+    """
+    value = request.args.get(name)
+    if value is None or value == "":
+        return None
+    try:
+        number = parse(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name} parameter")
+    if not (math.isfinite(number) and number >= 0):
+        raise ValueError(f"Invalid {name} parameter")
+    return number
+
+@app.route('/recommend_cities', methods=['GET'])
+def recommend_cities():
+    user_id_str = request.args.get('user_id')
+    if user_id_str is None or not user_id_str.isdigit():
+        return jsonify({"error": "Missing or invalid user_id parameter"}), 400
+    user_id = int(user_id_str)
+    snap = snapshot
+    with snap.lock.reading():
+        with stage("user_lookup"):
+            user = get_user_record(user_id, snap)
+        if user is None:
+            return jsonify({"error": "User ID not found"}), 404
+        window_str = request.args.get('window', str(DEFAULT_AGE_WINDOW))
+        if not window_str.isdigit():
+            return jsonify({"error": "Invalid window parameter"}), 400
+        window = int(window_str)
+        try:
+            max_budget = optional_number('max_budget')
+            max_days = optional_number('max_days')
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        # Unfiltered requests keep the keys shared with the batch and export endpoints
+        filters = () if max_budget is None and max_days is None else (max_budget, max_days)
+        top_n = 5
+        etag = make_etag(snap.data_version, user_id, top_n, window, *filters)
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+        cache_key = (user_id, top_n, window, snap.data_version) + filters
+        result = result_cache.get(cache_key)
+        if result is None:
+            if window == DEFAULT_AGE_WINDOW and not filters:
+                with stage("precomputed_lookup"):
+                    result = lookup_precomputed(user_id, top_n=top_n, snap=snap)
+            if result is None:
+                allowed = snap.place_stats.allowed(max_budget, max_days, len(snap.index.place_names))
+                result = build_recommendations(user_id, top_n=top_n, window=window, snap=snap, allowed=allowed)
+            result_cache.put(cache_key, result)
+    with stage("serialization"):
+        response = jsonify(result)
+    response.set_etag(etag)
+    return response
+
+def build_recommendations_batch(user_ids, top_n=5, chunk_size=BATCH_CHUNK_SIZE):
+    """
+    Yields (user_id, payload) for every id; payload is None for unknown users.
+    Every group aggregate is precomputed in the histograms, so users only share
+    the result cache; chunking keeps each step's working set bounded, and ingest
+    can run between chunks.
+    """
+    snap = snapshot
+    for start in range(0, len(user_ids), chunk_size):
+        with snap.lock.reading():
+            chunk = []
+            for uid in user_ids[start:start + chunk_size]:
+                if get_user_record(uid, snap) is None:
+                    chunk.append((uid, None))
+                    continue
+                cache_key = (uid, top_n, DEFAULT_AGE_WINDOW, snap.data_version)
+                result = result_cache.get(cache_key)
+                if result is None:
+                    result = build_recommendations(uid, top_n=top_n, snap=snap)
+                    result_cache.put(cache_key, result)
+                chunk.append((uid, result))
+        yield from chunk
+
+@app.route('/recommend_cities/batch', methods=['POST'])
+def recommend_cities_batch():
+    payload = request.get_json(silent=True) or {}
+    user_ids = payload.get('user_ids')
+    if not isinstance(user_ids, list) or not all(isinstance(uid, int) for uid in user_ids):
+        return jsonify({"error": "user_ids must be a list of integers"}), 400
+    if len(user_ids) > MAX_BATCH_USERS:
+        return jsonify({"error": f"At most {MAX_BATCH_USERS} user_ids per batch"}), 400
+    by_user = dict(build_recommendations_batch(user_ids))
+    results = []
+    for uid in user_ids:
+        if by_user[uid] is None:
+            results.append({"user_id": uid, "error": "User ID not found"})
+        else:
+            results.append({"user_id": uid, **by_user[uid]})
+    return jsonify({"results": results})
+
+@app.route('/places/stats', methods=['GET'])
+def places_stats():
+    """
+    Per-place trip statistics: trip count, budget and duration percentiles, latest visit.
+    ?place=<name> returns that place only (404 when it has no trips).
+    """
+    snap = snapshot
+    with snap.lock.reading():
+        index = snap.index
+        etag = make_etag(snap.data_version, "places_stats", request.args.get('place'))
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+        codes = None
+        place = request.args.get('place')
+        if place is not None:
+            code = index.code_of_place.get(normalize_place(place))
+            # Places only named as a user's recent place have a code but no trips
+            if code is None or code >= snap.place_stats.n_places or not snap.place_stats.trips[code]:
+                return jsonify({"error": "Place not found"}), 404
+            codes = [code]
+        places = snap.place_stats.records(index.place_names, codes)
+    response = jsonify({"places": places})
+    response.set_etag(etag)
+    return response
+
+@app.route('/trending', methods=['GET'])
+def trending():
+    """
+    Places rising fastest over each of TRENDING_WINDOWS days (or ?window=), among the
+    trips of everyone or of users in ?city= and/or ?age_band= (e.g. 20-29).
+    ?limit= places per window. Served from counters kept up to date by ingest.
+    """
+    snap = snapshot
+    with snap.lock.reading():
+        counters = snap.trending
+        try:
+            window = optional_number('window', int)
+            if window is not None and window not in counters.windows:
+                raise ValueError(f"window must be one of {', '.join(map(str, counters.windows))}")
+            limit = optional_number('limit', int)
+            if limit is not None and not 0 < limit <= MAX_TRENDING_TOP_N:
+                raise ValueError(f"limit must be between 1 and {MAX_TRENDING_TOP_N}")
+            band = request.args.get('age_band')
+            band = counters.parse_band(band) if band else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        windows = None if window is None else [window]
+        city = normalize_place(request.args.get('city', '')) or None
+        limit = limit or TRENDING_TOP_N
+        etag = make_etag(snap.data_version, "trending", windows, city, band, limit)
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+        cache_key = ("trending", window, city, band, limit, snap.data_version)
+        result = result_cache.get(cache_key)
+        if result is None:
+            result = counters.report(windows, city, band, limit)
+            result_cache.put(cache_key, result)
+    response = jsonify(result)
+    response.set_etag(etag)
+    return response
+
+# --- Export ---
+def export_chunks(snap, after=None, city=None, min_age=None, max_age=None, limit=None, top_n=5):
+    """
+    Yields NDJSON chunks with one {"user_id", "user"} line per user with an id above
+    `after` that passes the filters, in ascending id order. Ids are walked through the
+    index in fixed-size steps, so memory does not grow with the number of users; the
+    read lock is held per chunk, so ingest can run in between. Results are taken from
+    the cache or the materialized store when present but not cached, so an export
+    does not evict the entries serving live traffic.
+    """
+    city = None if city is None else normalize_place(city)
+    chunk_size = 1
+    while limit is None or limit > 0:
+        size = chunk_size if limit is None else min(chunk_size, limit)
+        with snap.lock.reading():
+            index = snap.index
+            scanned = index.user_ids_after(after, EXPORT_SCAN_SIZE)
+            if not scanned:
+                return
+            rows = index.rows_of(np.asarray(scanned, dtype=np.int64))
+            keep = np.ones(len(rows), dtype=bool)
+            if city is not None:
+                codes = [code for code, name in enumerate(index.city_names) if normalize_place(name) == city]
+                keep &= np.isin(index.user_cities[rows], codes)
+            ages = index.ages[rows]
+            if min_age is not None:
+                keep &= ages >= min_age
+            if max_age is not None:
+                keep &= ages <= max_age
+            matched = np.asarray(scanned)[keep][:size].tolist()
+            # Resume after the last exported user, or after the scan when it ran out of matches
+            after = matched[-1] if len(matched) == size else scanned[-1]
+            lines = []
+            for uid in matched:
+                cache_key = (uid, top_n, DEFAULT_AGE_WINDOW, snap.data_version)
+                result = (
+                    result_cache.get(cache_key) or lookup_precomputed(uid, top_n=top_n, snap=snap)
+                    or build_recommendations(uid, top_n=top_n, snap=snap)
+                )
+                lines.append(app.json.dumps({"user_id": uid, **result}, separators=(",", ":")) + "\n")
+        if lines:
+            yield "".join(lines)
+            chunk_size = EXPORT_CHUNK_SIZE
+        if limit is not None:
+            limit -= len(matched)
+
+@app.route('/recommend_cities/export', methods=['GET'])
+def recommend_cities_export():
+    """
+    Streams recommendations for every user as newline-delimited JSON, one
+    {"user_id", "user": {"recommendations": ...}} line per user in ascending id order.
+    Filters: city (case-insensitive), min_age/max_age (inclusive), limit (lines).
+    An interrupted export resumes with after=<last user_id received>.
+    """
+    try:
+        after = optional_number('after', int)
+        min_age = optional_number('min_age')
+        max_age = optional_number('max_age')
+        limit = optional_number('limit', int)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    chunks = export_chunks(snapshot, after, request.args.get('city'), min_age, max_age, limit)
+    # Not buffered by proxies either, so the first line reaches the client at once
+    return Response(chunks, mimetype="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+# --- Ingest ---
+def ingest(parse, add, path, id_field=None):
+    """
+    Validates a POST body, appends its rows to the data file and applies them to the
+    live snapshot, in time proportional to the rows. Returns (response, status).
+    """
+    if COLUMNAR_DIR:
+        return {"error": "Ingest needs the CSV data files; rebuild the columnar store instead"}, 409
+    global loaded_source_version, loaded_positions
+    payload = request.get_json(silent=True)
+    with ingest_lock:
+        if source_version() != loaded_source_version:
+            # Rows other workers added go in first, so ids are validated against them too
+            _catch_up_safely()
+        snap = snapshot
+        try:
+            records, rows = parse(payload, snap.index)
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        with data_files_locked() as files:
+            before = source_version()
+            append_csv_rows(files[path], rows, id_field)
+            after = source_version()
+            positions = file_positions()
+        add(snap, records)
+        snap.data_version = after
+        if before == loaded_source_version:
+            loaded_source_version, loaded_positions = after, positions
+        else:
+            # Another process changed the files too; the watcher's reload picks its rows up
+            reload_async()
+        return {"added": len(records), "data_version": snap.data_version}, 201
+
+@app.route('/users', methods=['POST'])
+def add_users():
+    body, status = ingest(parse_users, Snapshot.add_users, USERS_FILE)
+    return jsonify(body), status
+
+@app.route('/trips', methods=['POST'])
+def add_trips():
+    body, status = ingest(parse_trips, Snapshot.add_trips, TRIPS_FILE, id_field="booking_id")
+    return jsonify(body), status
+
+# --- Reload ---
+def catch_up():
+    """
+    Adds the rows appended to the data files since this process loaded or last caught up
+    (another worker's ingest) to the live snapshot, in time proportional to those rows.
+    Returns False, changing nothing, when the files changed any other way or hold rows the
+    snapshot cannot take in place (a repeated user id, a trip of an unknown user); call
+    with ingest_lock held.
+    """
+    global loaded_source_version, loaded_positions
+    snap = snapshot
+    with data_files_locked():
+        positions = file_positions()
+        if any(ino != old_ino or size < old_size for (ino, size), (old_ino, old_size) in zip(positions, loaded_positions)):
+            return False
+        users_df = read_appended(USERS_FILE, loaded_positions[0][1])
+        trips_df = read_appended(TRIPS_FILE, loaded_positions[1][1])
+        version = source_version()
+    users, trips = users_from_frame(users_df), trips_from_frame(trips_df)
+    new_ids = {user[0] for user in users}
+    if len(new_ids) < len(users) or any(snap.index.row(user_id) is not None for user_id in new_ids):
+        return False
+    if any(snap.index.row(trip[0]) is None and trip[0] not in new_ids for trip in trips):
+        return False
+    if users:
+        snap.add_users(users)
+    if trips:
+        snap.add_trips(trips)
+    snap.data_version = version
+    loaded_source_version, loaded_positions = version, positions
+    return True
+
+def _catch_up_safely():
+    if COLUMNAR_DIR:
+        return False
+    try:
+        return catch_up()
+    except Exception as e:
+        log.error("Error reading appended rows: %s", e)
+        return False
+
+def reload_snapshot(force=False):
+    """
+    Brings the snapshot up to date when the data files changed (or force) and returns
+    whether it did: appended rows are added in place, anything else builds a new snapshot
+    and swaps it in.
+    """
+    global snapshot, loaded_source_version, loaded_positions
+    with ingest_lock:
+        version = source_version()
+        if not force and version == loaded_source_version:
+            return False
+        started = time.time()
+        if not force and _catch_up_safely():
+            log.info("Added appended rows to snapshot %s in %.3fs", snapshot.data_version, time.time() - started)
+            return True
+        with data_files_locked():
+            version, positions = source_version(), file_positions()
+            new_snapshot = load_snapshot()
+        snapshot, loaded_source_version, loaded_positions = new_snapshot, version, positions
+    log.info("Reloaded data snapshot %s in %.2fs", new_snapshot.data_version, time.time() - started)
+    return True
+
+def reload_async(force=True):
+    threading.Thread(target=_reload_safely, args=(force,), daemon=True).start()
+
+def _reload_safely(force):
+    try:
+        reload_snapshot(force)
+    except Exception as e:
+        log.error("Error reloading data snapshot: %s", e)
+
+def _watch_files():
+    while True:
+        time.sleep(RELOAD_POLL_SECONDS)
+        _reload_safely(force=False)
+
+watcher_pid = None
+# Data version a background reload was started for, so requests don't start another
+reload_pending_version = None
+
+def catch_up_if_changed():
+    """
+    Adds rows other processes appended since this one loaded or caught up, when a stat of
+    the data files shows they changed, so the request that follows sees them. Any other
+    change is reloaded in the background while requests keep the current snapshot.
+    """
+    global reload_pending_version
+    version = source_version()
+    if version in (loaded_source_version, reload_pending_version):
+        return
+    with ingest_lock:
+        if source_version() == loaded_source_version or _catch_up_safely():
+            return
+        reload_pending_version = source_version()
+    reload_async(force=False)
+
+@app.before_request
+def follow_data_files():
+    """
+    Every request first catches up with the data files, so a user ingested through one
+    serve.py worker is found by the next request to any worker. One watcher thread per
+    process, started on its first request (so after serve.py forks), keeps an idle worker
+    current too.
+    """
+    global watcher_pid
+    if RELOAD_POLL_SECONDS <= 0:
+        return
+    if watcher_pid != os.getpid():
+        watcher_pid = os.getpid()
+        threading.Thread(target=_watch_files, daemon=True).start()
+    try:
+        catch_up_if_changed()
+    except Exception as e:
+        log.error("Error checking the data files: %s", e)
+
+try:
+    # kill -HUP reloads without a restart
+    signal.signal(signal.SIGHUP, lambda signum, frame: reload_async())
+except ValueError:
+    # Imported outside the main thread
+    pass
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify(result_cache.stats())
 
 @app.route('/', methods=["GET"])
 def home():
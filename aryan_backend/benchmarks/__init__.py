@@ -0,0 +1,19 @@
+"""
+Offline benchmarks for both recommenders.
+
+- datagen: synthetic users/trips CSVs and Mongo documents with skewed place popularity
+- timing: per-call timers, result files and run-to-run comparison
+- run: micro-benchmarks and end-to-end endpoint timings through the Flask test client;
+  api/index.py runs against an in-process mongomock database
+- cold_start: api/index.py cold starts in new interpreters, with and without a snapshot file
+- load: concurrent traffic against either app served from its own process on generated data,
+  with throughput, latency percentiles, errors and per-process CPU/RSS
+
+Everything runs offline; the Mongo benchmarks need `pip install mongomock`, which
+the deployed apps do not.
+
+Usage (from aryan_backend/):
+    python -m benchmarks.run --users 100000 --out bench/results.json
+    python -m benchmarks.run --users 100000 --out bench/new.json --compare bench/results.json
+    python -m benchmarks.load --target csv --users 100000 --concurrency 16 --out bench/load.json
+"""
@@ -0,0 +1,90 @@
+"""
+Cold starts of api/index.py: each sample is a new interpreter that imports the app
+and answers one GET /recommend_cities, as a serverless instance does for its first
+request after being started. The import, the snapshot load (from the database or the
+SNAPSHOT_FILE, including the numpy and pandas imports the app defers to it) and the
+request on the loaded snapshot are timed separately.
+
+The child processes hold the benchmark documents in an in-process mongomock database.
+pymongo and mongomock are imported before the clock starts, so neither the driver
+import nor any network time is counted: against a real deployment the full loads also
+wait on the transfer of both collections, and the first query on the handshake.
+
+Usage (through run.py, which passes the documents):
+    python -m benchmarks.run --only mongo --cold-starts 5
+"""
+import json
+import os
+import pickle
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_DIR = os.path.join(ROOT, "api")
+
+
+def bench_cold_start(index, snapshot, user_docs, trip_docs, oid_str, samples, work_dir):
+    """
+    Cold-start timings without and with a SNAPSHOT_FILE written from `snapshot`:
+    {"mongo.cold_start.<load|snapshot_file>.<import|snapshot_load|first_request|total>": summary},
+    plus the in-process write and read of that file.
+    """
+    from benchmarks.timing import summarize, time_once
+
+    docs_path = os.path.join(work_dir, "documents.pickle")
+    with open(docs_path, "wb") as f:
+        collections = {index.USERS_COLLECTION: user_docs, index.TRIPS_COLLECTION: trip_docs}
+        pickle.dump((index.DB_NAME, collections), f, protocol=pickle.HIGHEST_PROTOCOL)
+    snapshot_path = os.path.join(work_dir, "snapshot.pickle")
+    results = {}
+    _, results["mongo.snapshot_file.write"] = time_once(lambda: index.write_snapshot_file(snapshot, snapshot_path))
+    _, results["mongo.snapshot_file.read"] = time_once(lambda: index.read_snapshot_file(snapshot_path))
+    for name, snapshot_file in (("load", None), ("snapshot_file", snapshot_path)):
+        env = {k: v for k, v in os.environ.items() if k not in ("SNAPSHOT_FILE", "SNAPSHOT_FILE_WRITE")}
+        if snapshot_file:
+            env["SNAPSHOT_FILE"] = snapshot_file
+        env["PYTHONPATH"] = os.pathsep.join([API_DIR, ROOT, env.get("PYTHONPATH", "")])
+        runs = []
+        for _ in range(samples):
+            child = subprocess.run(
+                [sys.executable, "-m", "benchmarks.cold_start", docs_path, oid_str],
+                cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+            )
+            runs.append(json.loads(child.stdout.strip().splitlines()[-1]))
+        for phase in ("import", "snapshot_load", "first_request", "total"):
+            results[f"mongo.cold_start.{name}.{phase}"] = summarize([run[phase] for run in runs])
+    return results
+
+
+def child(docs_path, oid_str):
+    """Times one cold start; prints {"import", "snapshot_load", "first_request", "total"} in seconds."""
+    import contextlib
+
+    import mongomock
+    import pymongo
+
+    with open(docs_path, "rb") as f:
+        db_name, collections = pickle.load(f)
+    mongo = mongomock.MongoClient()
+    for name, docs in collections.items():
+        mongo[db_name][name].insert_many(docs)
+    pymongo.MongoClient = lambda *a, **kw: mongo
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        import index
+        imported = time.perf_counter()
+        index.current_data()
+        loaded = time.perf_counter()
+        response = index.app.test_client().get(f"/recommend_cities?id={oid_str}")
+        answered = time.perf_counter()
+    assert response.status_code == 200, response.status_code
+    print(json.dumps({
+        "import": imported - started, "snapshot_load": loaded - imported,
+        "first_request": answered - loaded, "total": answered - started,
+    }))
+
+
+if __name__ == "__main__":
+    child(*sys.argv[1:])
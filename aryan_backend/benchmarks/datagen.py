@@ -0,0 +1,212 @@
+"""
+Synthetic data for the recommenders.
+
+Users get a uniform age, a city and a Poisson number of trips; trip destinations
+and cities follow a Zipf-like popularity curve, weight 1 / rank**skew (skew=0 is
+uniform, larger values concentrate traffic on a few places). A user's visited
+places and most recent place are derived from their trips, as in the real data.
+Output is a pure function of the arguments, so a seed reproduces a dataset.
+
+Usage (from aryan_backend/):
+    python -m benchmarks.datagen --users 1000000 --skew 1.2 --out bench/data
+"""
+import argparse
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+
+BASE_PLACES = [
+    "Goa", "Dubai", "London", "Paris", "Bali", "Manali", "Jaipur", "Singapore", "Kerala",
+    "Mysore", "Shimla", "Udaipur", "Rishikesh", "Darjeeling", "Ooty", "Leh", "Tokyo",
+    "Bangkok", "Maldives", "New York", "Kathmandu", "Colombo", "Andaman", "Munnar",
+    "Varanasi", "Agra", "Hampi", "Coorg", "Pondicherry", "Amritsar",
+]
+CITIES = [
+    "Mumbai", "Delhi", "Bangalore", "Chennai", "Kolkata", "Hyderabad", "Pune", "Ahmedabad",
+    "Jaipur", "Surat", "Lucknow", "Kanpur", "Nagpur", "Indore", "Bhopal", "Patna",
+    "Vadodara", "Chandigarh", "Kochi", "Coimbatore",
+]
+USER_COLUMNS = [
+    "user_id", "f_name", "l_name", "age", "email", "mobile", "city_of_residence",
+    "country_of_residence", "number_of_trips", "places_visited", "recently_visited_place", "username",
+]
+TRIP_COLUMNS = [
+    "booking_id", "user_id", "place_of_visit", "duration_of_visit", "start_date", "end_date", "overall_budget",
+]
+FIRST_DAY = datetime.date(2021, 1, 1)
+DAYS = 4 * 365
+CHUNK_SIZE = 250000
+# Trip ObjectIds count up from here, clear of any user id
+TRIP_ID_BASE = 1 << 95
+
+
+def place_names(n_places):
+    return BASE_PLACES[:n_places] + [f"Place {i}" for i in range(len(BASE_PLACES), n_places)]
+
+
+def popularity(n, skew):
+    weights = 1.0 / np.arange(1, n + 1) ** skew
+    return weights / weights.sum()
+
+
+def user_oid(user_id):
+    """Deterministic 24-hex ObjectId string for a numeric user id."""
+    return "%024x" % user_id
+
+
+def generate_chunks(n_users, skew=1.0, n_places=200, trips_per_user=3.0, seed=0, chunk_size=CHUNK_SIZE):
+    """
+    Yields one dict of column arrays per chunk of users:
+    users: user_id, age, city, visited (list of place lists), recent (place index, -1 without trips)
+    trips: trip_user, trip_place, start_day, duration, budget, sorted by user then end day
+    Place and city values are indexes into place_names(n_places) and CITIES.
+    """
+    rng = np.random.default_rng(seed)
+    place_p = popularity(n_places, skew)
+    city_p = popularity(len(CITIES), skew)
+    for start in range(1, n_users + 1, chunk_size):
+        user_ids = np.arange(start, min(start + chunk_size, n_users + 1), dtype=np.int64)
+        n = len(user_ids)
+        n_trips = rng.poisson(trips_per_user, n)
+        trip_user = np.repeat(user_ids, n_trips)
+        trip_place = rng.choice(n_places, len(trip_user), p=place_p)
+        start_day = rng.integers(0, DAYS, len(trip_user))
+        duration = rng.integers(1, 15, len(trip_user))
+        order = np.lexsort((start_day + duration, trip_user))
+        trip_user, trip_place = trip_user[order], trip_place[order]
+        start_day, duration = start_day[order], duration[order]
+
+        bounds = np.concatenate([[0], np.cumsum(n_trips)])
+        visited = []
+        recent = np.full(n, -1, dtype=np.int64)
+        for i in range(n):
+            codes = trip_place[bounds[i]:bounds[i + 1]].tolist()
+            visited.append(list(dict.fromkeys(codes)))
+            if codes:
+                recent[i] = codes[-1]
+        yield {
+            "user_id": user_ids,
+            "age": rng.integers(18, 71, n),
+            "city": rng.choice(len(CITIES), n, p=city_p),
+            "visited": visited,
+            "recent": recent,
+            "trip_user": trip_user,
+            "trip_place": trip_place,
+            "start_day": start_day,
+            "duration": duration,
+            "budget": rng.integers(5000, 200000, len(trip_user)),
+        }
+
+
+def _dates(days):
+    return (np.datetime64(FIRST_DAY) + days.astype("timedelta64[D]")).astype(str)
+
+
+def write_csv(out_dir, n_users, skew=1.0, n_places=200, trips_per_user=3.0, seed=0):
+    """Writes users.csv and trips.csv in the shape of data/; returns their paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    users_file = os.path.join(out_dir, "users.csv")
+    trips_file = os.path.join(out_dir, "trips.csv")
+    places = np.asarray(place_names(n_places), dtype=object)
+    cities = np.asarray(CITIES, dtype=object)
+    booking_id = 1
+    for i, chunk in enumerate(generate_chunks(n_users, skew, n_places, trips_per_user, seed)):
+        ids = chunk["user_id"]
+        names = np.char.add("user", ids.astype(str)).astype(object)
+        # Users without trips still list one place, like every row of the real data
+        fallback = ids % n_places
+        recent = np.where(chunk["recent"] >= 0, chunk["recent"], fallback)
+        visited = [
+            ", ".join(places[codes]) if codes else places[f]
+            for codes, f in zip(chunk["visited"], fallback.tolist())
+        ]
+        users = pd.DataFrame({
+            "user_id": ids,
+            "f_name": names,
+            "l_name": "Synthetic",
+            "age": chunk["age"],
+            "email": names + "@example.com",
+            "mobile": 9000000000 + ids,
+            "city_of_residence": cities[chunk["city"]],
+            "country_of_residence": "India",
+            "number_of_trips": [len(codes) for codes in chunk["visited"]],
+            "places_visited": visited,
+            "recently_visited_place": places[recent],
+            "username": names,
+        }, columns=USER_COLUMNS)
+        n_trips = len(chunk["trip_user"])
+        trips = pd.DataFrame({
+            "booking_id": np.arange(booking_id, booking_id + n_trips),
+            "user_id": chunk["trip_user"],
+            "place_of_visit": places[chunk["trip_place"]],
+            "duration_of_visit": chunk["duration"],
+            "start_date": _dates(chunk["start_day"]),
+            "end_date": _dates(chunk["start_day"] + chunk["duration"]),
+            "overall_budget": np.char.add("INR ", chunk["budget"].astype(str)),
+        }, columns=TRIP_COLUMNS)
+        booking_id += n_trips
+        users.to_csv(users_file, mode="w" if i == 0 else "a", header=i == 0, index=False)
+        trips.to_csv(trips_file, mode="w" if i == 0 else "a", header=i == 0, index=False)
+    return users_file, trips_file
+
+
+def mongo_documents(n_users, skew=1.0, n_places=200, trips_per_user=3.0, seed=0):
+    """
+    Returns (user_docs, trip_docs) shaped like the app's collections: users carry
+    placesVisited and recentlyVisited (most recent first), trips a destination and
+    updatedAt. Ids are user_oid(user_id), so they line up with the CSV user ids.
+    """
+    from bson import ObjectId
+    places = place_names(n_places)
+    first = datetime.datetime.combine(FIRST_DAY, datetime.time())
+    user_docs, trip_docs = [], []
+    for chunk in generate_chunks(n_users, skew, n_places, trips_per_user, seed):
+        oids = {}
+        for uid, age, city, codes, recent in zip(
+            chunk["user_id"].tolist(), chunk["age"].tolist(), chunk["city"].tolist(),
+            chunk["visited"], chunk["recent"].tolist()
+        ):
+            oids[uid] = ObjectId(user_oid(uid))
+            user_docs.append({
+                "_id": oids[uid],
+                "f_name": f"user{uid}",
+                "age": age,
+                "city": CITIES[city],
+                "placesVisited": [places[c] for c in codes],
+                "recentlyVisited": [places[recent]] if recent >= 0 else [],
+                "updatedAt": first + datetime.timedelta(seconds=uid),
+            })
+        for uid, code, start_day, duration, budget in zip(
+            chunk["trip_user"].tolist(), chunk["trip_place"].tolist(), chunk["start_day"].tolist(),
+            chunk["duration"].tolist(), chunk["budget"].tolist()
+        ):
+            trip_docs.append({
+                "_id": ObjectId(user_oid(TRIP_ID_BASE + len(trip_docs))),
+                "user_id": oids[uid],
+                "destination": places[code],
+                "budget": budget,
+                "startDate": first + datetime.timedelta(days=start_day),
+                "updatedAt": first + datetime.timedelta(days=start_day + duration),
+            })
+    return user_docs, trip_docs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic users.csv/trips.csv.")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--skew", type=float, default=1.0)
+    parser.add_argument("--places", type=int, default=200)
+    parser.add_argument("--trips-per-user", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench/data")
+    args = parser.parse_args(argv)
+    users_file, trips_file = write_csv(
+        args.out, args.users, args.skew, args.places, args.trips_per_user, args.seed
+    )
+    print(f"Wrote {users_file} and {trips_file}")
+
+
+if __name__ == "__main__":
+    main()
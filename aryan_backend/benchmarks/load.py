@@ -0,0 +1,471 @@
+"""
+Concurrent load tests of GET /recommend_cities against local stand-ins.
+
+Starts the app in its own process on generated data, then replays a mix of user ids
+from client threads that each keep one connection open:
+- csv: app_backend.py on generated CSVs, threaded like `python app_backend.py`,
+  or pre-forked through serve.py with --workers (waitress, from requirements-serve.txt)
+- api: api/index.py, threaded, on generated documents in an in-process mongomock
+  database standing in for MongoDB (no network, so no database round trips are timed)
+
+User mix: --hot-share of the requests go to --hot-users users picked at random and
+weighted 1 / rank**skew like datagen's places, --cold-share to cold-start users (no
+trips; in the Mongo data no places either), the rest to any user uniformly.
+
+Without --rate every client sends its next request as soon as the last one returns
+(closed loop). With --rate, requests fall due at fixed intervals however fast the
+server is (open loop), and latency counts from when a request was due, so queueing
+behind a slow server shows in the percentiles rather than as a lower request rate.
+
+Reported over the measured window (after --warmup seconds): throughput, latency
+percentiles overall and per kind of user, status and error counts, and CPU and RSS
+per process for the server (master and workers) and the load generator, read from
+/proc (Linux only). Pages pre-forked workers share with the master count in the RSS of
+each. A load generator near 100% CPU means the client, not the server, set the pace. Results use run.py's file format; --compare flags a p50 or p99 that grew,
+or a throughput that fell, by more than --tolerance, matching scenarios across targets (so
+csv and csv_prefork runs compare) but only between runs with the same --concurrency and --rate.
+
+Usage (from aryan_backend/):
+    python -m benchmarks.load --target csv --users 100000 --concurrency 16 --out bench/load_csv.json
+    python -m benchmarks.load --target csv --users 100000 --workers 4 --rate 400 --compare bench/load_csv.json
+    python -m benchmarks.load --target api --users 5000 --concurrency 8 --out bench/load_api.json
+"""
+import argparse
+import http.client
+import itertools
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from benchmarks import datagen
+from benchmarks.timing import compare_results, environment, load_results, save_results, summarize
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_DIR = os.path.join(ROOT, "api")
+USER_KINDS = ("hot", "cold_start", "other")
+ID_PARAMS = {"csv": "user_id", "api": "id"}
+DRAW_BLOCK = 1024
+SAMPLE_SECONDS = 0.5
+READY_TIMEOUT_SECONDS = 900
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+# --- Workload ---
+def generated_user_ids(args):
+    """(all user ids, cold-start user ids) of the generated data, as the target's endpoint takes them."""
+    ids, cold = [], []
+    for chunk in datagen.generate_chunks(args.users, args.skew, args.places, args.trips_per_user, args.seed):
+        no_trips = np.array([not codes for codes in chunk["visited"]], dtype=bool)
+        ids.extend(chunk["user_id"].tolist())
+        cold.extend(chunk["user_id"][no_trips].tolist())
+    as_param = datagen.user_oid if args.target == "api" else str
+    return [as_param(i) for i in ids], [as_param(i) for i in cold]
+
+
+class UserMix:
+    """Draws (kind, user id) for each request: a hot user, a cold-start user or anyone."""
+
+    def __init__(self, ids, cold_ids, hot_users, hot_share, cold_share, skew, seed):
+        rng = np.random.default_rng(seed)
+        cold = set(cold_ids)
+        warm = [i for i in ids if i not in cold]
+        picked = rng.choice(len(warm), size=min(hot_users, len(warm)), replace=False)
+        self.hot = [warm[i] for i in picked.tolist()]
+        self.hot_p = datagen.popularity(len(self.hot), skew)
+        self.cold = list(cold_ids)
+        self.ids = ids
+        self.hot_share = hot_share if self.hot else 0.0
+        self.cold_share = cold_share if self.cold else 0.0
+
+    def draws(self, seed):
+        """Endless (kind, user id) pairs for one client, drawn in blocks to keep NumPy off the request loop."""
+        rng = np.random.default_rng(seed)
+        while True:
+            u = rng.random(DRAW_BLOCK)
+            hot = rng.choice(len(self.hot), DRAW_BLOCK, p=self.hot_p).tolist() if self.hot else []
+            cold = rng.integers(0, len(self.cold), DRAW_BLOCK).tolist() if self.cold else []
+            other = rng.integers(0, len(self.ids), DRAW_BLOCK).tolist()
+            for i, x in enumerate(u.tolist()):
+                if x < self.hot_share:
+                    yield "hot", self.hot[hot[i]]
+                elif x < self.hot_share + self.cold_share:
+                    yield "cold_start", self.cold[cold[i]]
+                else:
+                    yield "other", self.ids[other[i]]
+
+
+# --- Stand-in servers ---
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def data_args(args):
+    return [
+        "--target", args.target, "--users", str(args.users), "--skew", str(args.skew),
+        "--places", str(args.places), "--trips-per-user", str(args.trips_per_user), "--seed", str(args.seed),
+    ]
+
+
+def start_server(args, port, data_dir):
+    """Starts the target on 127.0.0.1:port in a new process and returns it once it answers."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([API_DIR, ROOT, env.get("PYTHONPATH", "")])
+    # Serve the request path itself, not a store built for other data
+    for name in ("PRECOMPUTED_DIR", "COLUMNAR_DIR", "SNAPSHOT_FILE"):
+        env.pop(name, None)
+    if args.target == "csv":
+        env["USERS_FILE"], env["TRIPS_FILE"] = datagen.write_csv(
+            data_dir, args.users, args.skew, args.places, args.trips_per_user, args.seed
+        )
+    if args.workers:
+        command = [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(args.workers)]
+    else:
+        command = [sys.executable, "-m", "benchmarks.load", *data_args(args), "--serve-port", str(port)]
+    log_path = os.path.join(data_dir, "server.log")
+    with open(log_path, "w") as server_log:
+        process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=server_log)
+    deadline = time.time() + READY_TIMEOUT_SECONDS
+    while time.time() < deadline:
+        if process.poll() is not None:
+            with open(log_path) as f:
+                raise RuntimeError(f"server exited with status {process.returncode}:\n{f.read()[-4000:]}")
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        try:
+            connection.request("GET", "/")
+            if connection.getresponse().status == 200:
+                return process
+        except (OSError, http.client.HTTPException):
+            pass
+        finally:
+            connection.close()
+        time.sleep(0.2)
+    stop_server(process)
+    raise RuntimeError(f"server did not answer within {READY_TIMEOUT_SECONDS}s")
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def serve(args):
+    """Runs the target threaded on 127.0.0.1:--serve-port, as `python app_backend.py` does."""
+    if args.target == "api":
+        import mongomock
+        import pymongo
+        mongo = mongomock.MongoClient()
+        # Every MongoClient index.py creates is this in-process one
+        pymongo.MongoClient = lambda *a, **kw: mongo
+        import index
+        user_docs, trip_docs = datagen.mongo_documents(
+            args.users, args.skew, args.places, args.trips_per_user, args.seed
+        )
+        index.mongo.users.insert_many(user_docs)
+        index.mongo.trips.insert_many(trip_docs)
+        index.snapshot_cache.get()
+        app = index.app
+    else:
+        import app_backend
+        app = app_backend.app
+    app.run(host="127.0.0.1", port=args.serve_port, threaded=True)
+
+
+# --- Process statistics ---
+def process_tree(pid):
+    """pid and its descendants, from /proc (just pid where /proc is unavailable)."""
+    parents = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return [pid]
+    for entry in entries:
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                pass
+    tree = [pid]
+    for parent in tree:
+        tree.extend(child for child, ppid in parents.items() if ppid == parent)
+    return tree
+
+
+def cpu_and_rss(pid):
+    """(user + system CPU seconds, RSS bytes) of a process, or None when it cannot be read."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/status") as f:
+            rss = next((int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:")), 0)
+    except (OSError, IndexError, ValueError):
+        return None
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS, rss
+
+
+class ProcessSampler:
+    """Samples CPU time and RSS of the server's processes and of this one on a background thread."""
+
+    def __init__(self, server_pid):
+        self.server_pid = server_pid
+        self.samples = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            self.sample()
+            if self._stop.wait(SAMPLE_SECONDS):
+                self.sample()
+                return
+
+    def sample(self):
+        now = time.perf_counter()
+        roles = {pid: "worker" for pid in process_tree(self.server_pid)}
+        roles[self.server_pid] = "server"
+        roles[os.getpid()] = "generator"
+        for pid, role in roles.items():
+            stats = cpu_and_rss(pid)
+            if stats is not None:
+                self.samples.setdefault((role, pid), []).append((now, *stats))
+
+    def report(self, start, end):
+        """Per process over [start, end]: CPU as % of one core, peak and mean RSS in MB."""
+        rows = []
+        for (role, pid), samples in sorted(self.samples.items()):
+            window = [s for s in samples if start <= s[0] <= end]
+            if len(window) < 2:
+                continue
+            elapsed = window[-1][0] - window[0][0]
+            rss = np.array([s[2] for s in window], dtype=float) / 2 ** 20
+            rows.append({
+                "role": role,
+                "pid": pid,
+                "cpu_percent": round(100 * (window[-1][1] - window[0][1]) / elapsed, 1),
+                "rss_peak_mb": round(float(rss.max()), 1),
+                "rss_mean_mb": round(float(rss.mean()), 1),
+            })
+        return rows
+
+
+# --- Load generation ---
+def run_load(args, port, mix):
+    """
+    Drives the server for warmup + duration seconds; returns the (kind, status, latency
+    seconds) of the requests that completed in the measured window, and that window.
+    """
+    started = time.perf_counter()
+    measure_from = started + args.warmup
+    stop_at = measure_from + args.duration
+    path = f"/recommend_cities?{ID_PARAMS[args.target]}="
+    due_counter = itertools.count()
+    records = []
+
+    def client(n):
+        connection = None
+        draws = mix.draws((args.seed, n))
+        measured = []
+        while True:
+            if args.rate:
+                due = started + next(due_counter) / args.rate
+                if due >= stop_at:
+                    break
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                due = time.perf_counter()
+                if due >= stop_at:
+                    break
+            kind, user_id = next(draws)
+            try:
+                if connection is None:
+                    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=args.timeout)
+                connection.request("GET", path + user_id)
+                response = connection.getresponse()
+                response.read()
+                status = str(response.status)
+            except (OSError, http.client.HTTPException) as e:
+                status = type(e).__name__
+                connection.close()
+                connection = None
+            finished = time.perf_counter()
+            if measure_from <= finished <= stop_at:
+                measured.append((kind, status, finished - due))
+        if connection is not None:
+            connection.close()
+        records.extend(measured)
+
+    threads = [threading.Thread(target=client, args=(n,), daemon=True) for n in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return records, (measure_from, stop_at)
+
+
+def summarize_load(label, records, duration, processes):
+    """Results entries for one run: all requests, each kind of user and the processes."""
+    statuses = Counter(status for _, status, _ in records)
+    errors = {status: count for status, count in statuses.items() if status != "200"}
+    overall = summarize([latency for _, _, latency in records])
+    overall.update({
+        "throughput_rps": round(len(records) / duration, 2),
+        "errors": errors,
+        "error_rate": round(sum(errors.values()) / len(records), 6) if records else None,
+    })
+    results = {f"load.{label}.recommend_cities": overall}
+    for kind in USER_KINDS:
+        results[f"load.{label}.recommend_cities.{kind}"] = summarize(
+            [latency for k, _, latency in records if k == kind]
+        )
+    results[f"load.{label}.processes"] = {"processes": processes}
+    return results
+
+
+def print_report(label, results):
+    overall = results[f"load.{label}.recommend_cities"]
+    errors = sum(overall["errors"].values())
+    print(f"{label}: {overall['calls']} requests, {overall['throughput_rps']:.1f}/s, "
+          f"{errors} errors ({100 * (overall['error_rate'] or 0):.2f}%) {overall['errors'] or ''}")
+    print(f"{'latency':<12} {'calls':>7} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+    for kind in ("all",) + USER_KINDS:
+        summary = overall if kind == "all" else results[f"load.{label}.recommend_cities.{kind}"]
+        if summary["calls"]:
+            print(f"{kind:<12} {summary['calls']:>7} {summary['p50_ms']:>10.3f} {summary['p95_ms']:>10.3f} "
+                  f"{summary['p99_ms']:>10.3f} {summary['max_ms']:>10.3f}")
+    print(f"{'process':<20} {'cpu %':>8} {'rss peak MB':>12} {'rss mean MB':>12}")
+    for row in results[f"load.{label}.processes"]["processes"]:
+        print(f"{row['role'] + ' ' + str(row['pid']):<20} {row['cpu_percent']:>8.1f} "
+              f"{row['rss_peak_mb']:>12.1f} {row['rss_mean_mb']:>12.1f}")
+
+
+# Config keys that must match for two runs' latencies to be comparable; the target may differ
+LOAD_SHAPE = ("concurrency", "rate")
+
+
+def by_scenario(saved):
+    """Saved results keyed by scenario (recommend_cities, recommend_cities.hot, ...) without the load.<target> prefix."""
+    return {name.split(".", 2)[2]: summary for name, summary in saved["results"].items() if name.startswith("load.")}
+
+
+def compare_load(previous, current, tolerance):
+    """
+    Rows of (scenario, metric, before, after, regressed): p50/p99 growth and throughput loss
+    beyond tolerance. Scenarios are matched regardless of target, so csv and csv_prefork
+    runs compare; runs with a different concurrency or rate share no rows.
+    """
+    if any(previous["config"].get(key) != current["config"].get(key) for key in LOAD_SHAPE):
+        return []
+    previous, current = {"results": by_scenario(previous)}, {"results": by_scenario(current)}
+    rows = []
+    for metric in ("p50_ms", "p99_ms"):
+        for name, before, after, ratio, regressed in compare_results(previous, current, tolerance, metric):
+            rows.append((name, metric, before, after, regressed))
+    for name, after in sorted(current["results"].items()):
+        before = previous["results"].get(name) or {}
+        if "throughput_rps" in before and "throughput_rps" in after:
+            regressed = after["throughput_rps"] < before["throughput_rps"] / (1 + tolerance)
+            rows.append((name, "throughput_rps", before["throughput_rps"], after["throughput_rps"], regressed))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test GET /recommend_cities against a local stand-in server.")
+    parser.add_argument("--target", choices=["csv", "api"], default="csv")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="csv only: pre-fork this many workers through serve.py instead of one threaded process")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--skew", type=float, default=1.0, help="place and hot-user popularity skew")
+    parser.add_argument("--places", type=int, default=200)
+    parser.add_argument("--trips-per-user", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads, one connection each")
+    parser.add_argument("--rate", type=float, help="requests per second (open loop); default closed loop")
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds of load before measuring")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout in seconds")
+    parser.add_argument("--hot-users", type=int, default=100)
+    parser.add_argument("--hot-share", type=float, default=0.5)
+    parser.add_argument("--cold-share", type=float, default=0.05)
+    parser.add_argument("--out", default="bench/load.json")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p50/p99 growth and throughput loss")
+    parser.add_argument("--serve-port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.workers and args.target != "csv":
+        parser.error("--workers needs --target csv (serve.py serves app_backend)")
+    if args.hot_share + args.cold_share > 1:
+        parser.error("--hot-share plus --cold-share must not exceed 1")
+
+    if args.serve_port:
+        serve(args)
+        return
+
+    ids, cold_ids = generated_user_ids(args)
+    if args.cold_share and not cold_ids:
+        print("Warning: the generated data has no cold-start users; their share goes to other users")
+    mix = UserMix(ids, cold_ids, args.hot_users, args.hot_share, args.cold_share, args.skew, args.seed)
+    label = f"{args.target}_prefork" if args.workers else args.target
+
+    data_dir = tempfile.mkdtemp(prefix="load-data-")
+    try:
+        port = free_port()
+        process = start_server(args, port, data_dir)
+        sampler = ProcessSampler(process.pid)
+        sampler.start()
+        try:
+            records, (start, end) = run_load(args, port, mix)
+        finally:
+            sampler.stop()
+            stop_server(process)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    results = summarize_load(label, records, end - start, sampler.report(start, end))
+    config = {k: v for k, v in vars(args).items() if k not in ("out", "compare", "tolerance", "serve_port")}
+    save_results(args.out, config, environment(ROOT), results)
+    print_report(label, results)
+    print(f"Saved to {args.out}")
+
+    if args.compare:
+        previous = load_results(args.compare)
+        differing = {k: v for k, v in previous["config"].items() if config.get(k) != v and k not in ("target", "workers")}
+        if differing:
+            print(f"Warning: {args.compare} was run with a different config: {differing}")
+        rows = compare_load(previous, load_results(args.out), args.tolerance)
+        if not rows:
+            shape = {key: previous["config"].get(key) for key in LOAD_SHAPE}
+            sys.exit(f"No comparable results in {args.compare} (run with {shape}); "
+                     f"compare runs with the same {' and '.join(LOAD_SHAPE)}")
+        regressions = 0
+        for name, metric, before, after, regressed in rows:
+            regressions += regressed
+            print(f"{'REGRESSION' if regressed else 'ok':<10} {name:<44} {metric:<15} {before:>10.3f} -> {after:>10.3f}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
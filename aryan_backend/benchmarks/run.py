@@ -0,0 +1,312 @@
+"""
+Runs the benchmarks and writes a results file.
+
+CSV recommender (app_backend.py), on generated users.csv/trips.csv:
+- startup (CSV parse and index build)
+- get_places_by_similar_age, get_places_by_recent_visit, get_places_by_city
+- co-occurrence matrix build and per-user ranking (COVISIT_MODE=cooccurrence)
+- trending counters build and rank over every window, overall and per city
+- GET /recommend_cities with an empty result cache and with a warm one, with budget and
+  duration filters, POST /recommend_cities/batch
+
+Mongo recommender (api/index.py), on generated documents in an in-process mongomock database:
+- startup and snapshot load
+- get_recommendations_from_group over age and city peer groups
+- co-visitation groups: exact posting-list union vs MinHash nearest neighbours, with the
+  neighbours' recall against exact Jaccard top-K
+- co-visitation scores: the exact group's place scores vs a co-occurrence matrix row-sum
+- GET /recommend_cities uncached and cached, POST /recommend_cities/batch
+- cold starts (import, snapshot load and first request, each in a new interpreter) loading the data
+  from the database vs from a SNAPSHOT_FILE
+
+Each benchmark times the same seeded sample of users. Results are keyed
+"<app>.<benchmark>"; --compare flags benchmarks whose p50 grew by more than --tolerance
+and exits with status 1 if any did.
+"""
+import argparse
+import contextlib
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+from collections import ChainMap
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import datagen
+from benchmarks.cold_start import bench_cold_start
+from cooccurrence import PlaceCooccurrence
+from minhash_index import MinHashIndex
+from benchmarks.timing import (
+    compare_results, environment, load_results, save_results, time_calls, time_once,
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_DIR = os.path.join(ROOT, "api")
+BATCH_REPEATS = 3
+
+
+@contextlib.contextmanager
+def quiet():
+    """Discards the apps' stdout logging while timing (the formatting cost is still paid)."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def sample_ids(ids, n, seed):
+    rng = np.random.default_rng(seed)
+    picked = rng.choice(len(ids), size=min(n, len(ids)), replace=False)
+    return [ids[i] for i in picked.tolist()]
+
+
+def jaccard_recall(similar, place_sets, queries, k):
+    """
+    Mean share of each query user's exact top-k Jaccard neighbours that `similar` returns;
+    neighbours tied with the k-th are not required.
+    """
+    recalls = []
+    for user_id in queries:
+        query = place_sets[user_id]
+        exact = sorted(
+            (len(query & places) / len(query | places), other)
+            for other, places in place_sets.items() if places and other != user_id
+        )[::-1][:k]
+        if not exact:
+            continue
+        required = {other for score, other in exact if score > exact[-1][0]}
+        if required:
+            found = {other for other, _ in similar(query, k, exclude_user_id=user_id)}
+            recalls.append(len(required & found) / len(required))
+    return round(float(np.mean(recalls)), 4) if recalls else None
+
+
+def bench_csv(args, data_dir):
+    users_file, trips_file = datagen.write_csv(
+        data_dir, args.users, args.skew, args.places, args.trips_per_user, args.seed
+    )
+    os.environ["USERS_FILE"], os.environ["TRIPS_FILE"] = users_file, trips_file
+    results = {}
+    with quiet():
+        app_backend, results["csv.startup"] = time_once(lambda: importlib.import_module("app_backend"))
+
+    user_ids = sample_ids(app_backend.snapshot.index.all_user_ids(), args.samples, args.seed)
+    calls = [(uid,) for uid in user_ids]
+    for name in ("get_places_by_similar_age", "get_places_by_recent_visit", "get_places_by_city"):
+        results[f"csv.{name}"] = time_calls(getattr(app_backend, name), calls)
+
+    index = app_backend.snapshot.index
+    visited = app_backend.places_visited_entries(pd.read_csv(users_file, usecols=['places_visited'])['places_visited'])
+    cooccurrence, results["csv.cooccurrence.build"] = time_once(
+        lambda: PlaceCooccurrence.from_index(index, *visited, app_backend.COOCCURRENCE_HALF_LIFE_DAYS)
+    )
+    results["csv.cooccurrence.rank_user"] = time_calls(
+        lambda uid: cooccurrence.rank_user(index.row(uid), index.visited_places(uid), 5), calls
+    )
+
+    trending, results["csv.trending.build"] = time_once(lambda: app_backend.trending_of(index))
+    cities = [None] + sorted({key[0] for key in trending.facet_of_key if key[0]})
+    results["csv.trending.rank"] = time_calls(
+        lambda city: [trending.rank(window, city) for window in trending.windows],
+        [(cities[i % len(cities)],) for i in range(len(calls))]
+    )
+
+    client = app_backend.app.test_client()
+
+    def get(uid):
+        response = client.get(f"/recommend_cities?user_id={uid}")
+        assert response.status_code == 200, response.status_code
+
+    def get_filtered(uid):
+        response = client.get(f"/recommend_cities?user_id={uid}&max_budget=100000&max_days=10")
+        assert response.status_code == 200, response.status_code
+
+    def post(ids):
+        response = client.post("/recommend_cities/batch", json={"user_ids": ids})
+        assert response.status_code == 200, response.status_code
+
+    clear = app_backend.result_cache.clear
+    results["csv.recommend_cities.uncached"] = time_calls(get, calls, setup=clear)
+    results["csv.recommend_cities.filtered"] = time_calls(get_filtered, calls, setup=clear)
+    results["csv.recommend_cities.cached"] = time_calls(get, calls, warmup=len(calls))
+    results["csv.recommend_cities_batch.uncached"] = time_calls(
+        post, [(user_ids,)] * BATCH_REPEATS, warmup=1, setup=clear
+    )
+    return results
+
+
+def bench_mongo(args):
+    import mongomock
+    import pymongo
+    from bson import ObjectId
+
+    # Every MongoClient index.py creates (on first use) is this in-process one
+    mongo = mongomock.MongoClient()
+    pymongo.MongoClient = lambda *a, **kw: mongo
+    for path in (API_DIR, ROOT):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    results = {}
+    with quiet():
+        index, results["mongo.startup"] = time_once(lambda: importlib.import_module("index"))
+    user_docs, trip_docs = datagen.mongo_documents(
+        args.mongo_users, args.skew, args.places, args.trips_per_user, args.seed
+    )
+    index.mongo.users.insert_many(user_docs)
+    index.mongo.trips.insert_many(trip_docs)
+    with quiet():
+        snapshot, results["mongo.snapshot_load"] = time_once(index.snapshot_cache.get)
+
+    users = sample_ids(user_docs, args.samples, args.seed)
+    users_df = snapshot.users_df
+
+    def group_calls(build_ids):
+        calls = []
+        for user in users:
+            uid = str(user["_id"])
+            group = [i for i in build_ids(user) if i != uid]
+            visited = list(index.get_all_user_places(user))
+            calls.append((uid, group, visited))
+        return calls
+
+    def from_group(uid, group, visited):
+        index.get_recommendations_from_group(
+            uid, group, snapshot.trips_df, top_n=7, exclude_places=visited,
+            doc_cache=ChainMap({}, snapshot.user_docs)
+        )
+
+    age_calls = group_calls(
+        lambda user: users_df[users_df["age"].between(user["age"] - 5, user["age"] + 5)]["_id"].tolist()
+    )
+    city_calls = group_calls(
+        lambda user: users_df[snapshot.city_norm == index.normalize_place(user["city"])]["_id"].tolist()
+    )
+    with quiet():
+        results["mongo.get_recommendations_from_group.age"] = time_calls(from_group, age_calls)
+        results["mongo.get_recommendations_from_group.city"] = time_calls(from_group, city_calls)
+
+    place_sets = {uid: frozenset(index.get_all_user_places(doc)) for uid, doc in snapshot.user_docs.items()}
+    similar_users = MinHashIndex.build(
+        place_sets, num_perm=index.MINHASH_PERMUTATIONS, bands=index.MINHASH_BANDS, exact=index.MINHASH_EXACT
+    )
+    visited_calls = [(place_sets[str(user["_id"])], str(user["_id"])) for user in users]
+    results["mongo.co_visitors.exact"] = time_calls(
+        lambda places, uid: snapshot.place_index.co_visitors(places), visited_calls
+    )
+    results["mongo.co_visitors.minhash"] = time_calls(
+        lambda places, uid: similar_users.similar(places, index.MINHASH_TOP_K, exclude_user_id=uid),
+        visited_calls
+    )
+    results["mongo.co_visitors.minhash"]["recall"] = jaccard_recall(
+        similar_users.similar, place_sets, [uid for _, uid in visited_calls], index.MINHASH_TOP_K
+    )
+
+    with quiet():
+        results["mongo.co_visitation_scores.exact"] = time_calls(
+            lambda places, uid: index.group_place_scores(
+                snapshot.place_index.co_visitors(places, exclude_user_id=uid), snapshot.trips_df,
+                ChainMap({}, snapshot.user_docs)
+            ),
+            visited_calls
+        )
+    cooccurrence, results["mongo.cooccurrence.build"] = time_once(
+        lambda: index.build_cooccurrence(snapshot.place_index, index.trip_visits(snapshot.trips_df))
+    )
+    results["mongo.co_visitation_scores.cooccurrence"] = time_calls(
+        lambda places, uid: cooccurrence.rank_places(places, (), 7), visited_calls
+    )
+
+    client = index.app.test_client()
+    oid_strs = [str(ObjectId(user["_id"])) for user in users]
+
+    def get(oid_str):
+        response = client.get(f"/recommend_cities?id={oid_str}")
+        assert response.status_code == 200, response.status_code
+
+    def post(ids):
+        response = client.post("/recommend_cities/batch", json={"ids": ids})
+        assert response.status_code == 200, response.status_code
+
+    clear = index.result_cache.clear
+    calls = [(oid_str,) for oid_str in oid_strs]
+    with quiet():
+        results["mongo.recommend_cities.uncached"] = time_calls(get, calls, setup=clear)
+        results["mongo.recommend_cities.cached"] = time_calls(get, calls, warmup=len(calls))
+        results["mongo.recommend_cities_batch.uncached"] = time_calls(
+            post, [(oid_strs,)] * BATCH_REPEATS, warmup=1, setup=clear
+        )
+
+    if args.cold_starts:
+        work_dir = tempfile.mkdtemp(prefix="bench-cold-")
+        try:
+            with quiet():
+                results.update(bench_cold_start(
+                    index, snapshot, user_docs, trip_docs, oid_strs[0], args.cold_starts, work_dir
+                ))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def print_results(results):
+    print(f"{'benchmark':<48} {'calls':>6} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}")
+    for name, summary in sorted(results.items()):
+        print(f"{name:<48} {summary['calls']:>6} {summary['p50_ms']:>10.3f} "
+              f"{summary['p95_ms']:>10.3f} {summary['max_ms']:>10.3f}"
+              + (f"  recall {summary['recall']}" if "recall" in summary else ""))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark both recommenders on synthetic data.")
+    parser.add_argument("--users", type=int, default=10000, help="users in the generated CSVs")
+    parser.add_argument("--mongo-users", type=int, default=2000,
+                        help="users in the mongomock database (it holds every document in memory)")
+    parser.add_argument("--skew", type=float, default=1.0, help="place popularity skew, 0 is uniform")
+    parser.add_argument("--places", type=int, default=200)
+    parser.add_argument("--trips-per-user", type=float, default=3.0)
+    parser.add_argument("--samples", type=int, default=200, help="users timed per benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cold-starts", type=int, default=5,
+                        help="new interpreters timed per api/index.py cold-start variant, 0 to skip")
+    parser.add_argument("--only", choices=["csv", "mongo"])
+    parser.add_argument("--data-dir", help="keep the generated CSVs here instead of a temporary directory")
+    parser.add_argument("--out", default="bench/results.json")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p50 growth, 0.2 = 20%%")
+    args = parser.parse_args(argv)
+
+    # Measure the request path itself, not a store built for other data
+    for name in ("PRECOMPUTED_DIR", "COLUMNAR_DIR"):
+        os.environ.pop(name, None)
+
+    results = {}
+    if args.only in (None, "csv"):
+        data_dir = args.data_dir or tempfile.mkdtemp(prefix="bench-data-")
+        try:
+            results.update(bench_csv(args, data_dir))
+        finally:
+            if not args.data_dir:
+                shutil.rmtree(data_dir, ignore_errors=True)
+    if args.only in (None, "mongo"):
+        results.update(bench_mongo(args))
+
+    config = {k: v for k, v in vars(args).items() if k not in ("out", "compare", "tolerance", "data_dir")}
+    save_results(args.out, config, environment(ROOT), results)
+    print_results(results)
+    print(f"Saved {len(results)} benchmarks to {args.out}")
+
+    if args.compare:
+        previous = load_results(args.compare)
+        if previous["config"] != config:
+            print(f"Warning: {args.compare} was run with a different config: {previous['config']}")
+        regressions = 0
+        for name, before, after, ratio, regressed in compare_results(previous, load_results(args.out), args.tolerance):
+            regressions += regressed
+            print(f"{'REGRESSION' if regressed else 'ok':<10} {name:<48} {before:>10.3f} -> {after:>10.3f} ms ({ratio:.2f}x)")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
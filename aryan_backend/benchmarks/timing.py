@@ -0,0 +1,112 @@
+import json
+import os
+import platform
+import subprocess
+import time
+
+import numpy as np
+
+RESULTS_FORMAT = 1
+
+
+def summarize(seconds):
+    """Latency summary in milliseconds for a list of per-call durations in seconds."""
+    ms = np.asarray(seconds, dtype=float) * 1000
+    if len(ms) == 0:
+        return {"calls": 0}
+    return {
+        "calls": len(ms),
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "max_ms": round(float(ms.max()), 4),
+        "total_s": round(float(ms.sum()) / 1000, 4),
+    }
+
+
+def time_calls(fn, args_list, warmup=3, setup=None):
+    """
+    Calls fn(*args) for every entry of args_list and summarizes the per-call times.
+    The first `warmup` entries are also run once beforehand, untimed; setup(), when
+    given, runs untimed before every call (e.g. to clear a cache).
+    """
+    for args in args_list[:warmup]:
+        if setup is not None:
+            setup()
+        fn(*args)
+    samples = []
+    for args in args_list:
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def time_once(fn):
+    """Runs fn once; returns (result, summary)."""
+    started = time.perf_counter()
+    result = fn()
+    return result, summarize([time.perf_counter() - started])
+
+
+def git_revision(path):
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=path, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment(path):
+    import pandas as pd
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "cpus": os.cpu_count(),
+        "git_revision": git_revision(path),
+    }
+
+
+def save_results(path, config, env, results):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({
+            "format": RESULTS_FORMAT,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "config": config,
+            "environment": env,
+            "results": results,
+        }, f, indent=2, sort_keys=True)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_results(previous, current, tolerance, metric="p50_ms"):
+    """
+    Compares two saved runs benchmark by benchmark.
+    Returns rows of (name, before, after, ratio, regressed) for benchmarks present in
+    both; a benchmark regresses when after > before * (1 + tolerance).
+    """
+    rows = []
+    for name, after in sorted(current["results"].items()):
+        before = previous["results"].get(name)
+        if not before or metric not in before or metric not in after:
+            continue
+        if before[metric]:
+            ratio = after[metric] / before[metric]
+        else:
+            ratio = 1.0 if not after[metric] else float("inf")
+        rows.append((name, before[metric], after[metric], ratio, ratio > 1 + tolerance))
+    return rows
@@ -0,0 +1,152 @@
+"""
+Typed columnar store for the recommender's CSV data.
+
+Converts users.csv/trips.csv into one .npy file per column plus a meta.json of
+string dictionaries. Only the columns the recommender uses are kept:
+- places (trip destinations, recent places, places_visited) share one normalized dictionary
+- cities are dictionary-encoded (-1 when missing)
+- dates are integer days since the epoch (MISSING_DAY when missing)
+- budgets like "INR 47365" become integers (-1 when missing)
+- the comma-separated places_visited becomes offsets + values arrays
+
+load_columnar memory-maps every column, so workers share the pages instead of
+holding private copies.
+
+Usage (from aryan_backend/):
+    python columnar_store.py --users data/users.csv --trips data/trips.csv --out data/columnar
+"""
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from lookup_index import normalize_place
+
+META_FILE = "meta.json"
+MISSING_DAY = np.iinfo(np.int32).min
+
+USER_COLUMNS = ["user_id", "age", "city", "recent_place", "places_offsets", "places_values"]
+TRIP_COLUMNS = ["user_id", "place", "start_day", "end_day", "duration", "budget"]
+
+
+def csv_data_version(*paths):
+    """Version token for CSV files, derived from their sizes and modification times."""
+    stats = [os.stat(path) for path in paths]
+    raw = "|".join(f"{s.st_size}:{s.st_mtime_ns}" for s in stats)
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def parse_days(values):
+    """Date strings to int32 days since the epoch; unparseable or missing dates become MISSING_DAY."""
+    dates = pd.to_datetime(values, errors='coerce')
+    days = np.full(len(dates), MISSING_DAY, dtype=np.int32)
+    valid = dates.notna().to_numpy()
+    days[valid] = dates[valid].to_numpy().astype('datetime64[D]').astype(np.int64)
+    return days
+
+
+def parse_amounts(values):
+    """Amounts like "INR 47365" to int64; values without digits become -1."""
+    digits = pd.Series(values).astype(str).str.replace(r'[^0-9]', '', regex=True)
+    return pd.to_numeric(digits, errors='coerce').fillna(-1).to_numpy(dtype=np.int64)
+
+
+class ColumnarData:
+    """Memory-mapped columns of a converted store: data.users[column], data.trips[column]."""
+
+    missing_day = MISSING_DAY
+
+    def __init__(self, path):
+        with open(os.path.join(path, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.places = self.meta["places"]
+        self.cities = self.meta["cities"]
+        self.users = {
+            column: np.load(os.path.join(path, f"users_{column}.npy"), mmap_mode='r')
+            for column in USER_COLUMNS
+        }
+        self.trips = {
+            column: np.load(os.path.join(path, f"trips_{column}.npy"), mmap_mode='r')
+            for column in TRIP_COLUMNS
+        }
+
+    def places_visited(self, row):
+        offsets = self.users["places_offsets"]
+        values = self.users["places_values"][offsets[row]:offsets[row + 1]]
+        return [self.places[code] for code in values]
+
+
+def load_columnar(path):
+    return ColumnarData(path)
+
+
+def convert_csv(users_file, trips_file, out_dir):
+    """Writes the columnar store for a pair of CSVs and returns its meta."""
+    users_df = pd.read_csv(users_file, usecols=[
+        'user_id', 'age', 'city_of_residence', 'places_visited', 'recently_visited_place'
+    ])
+    trips_df = pd.read_csv(trips_file, usecols=[
+        'user_id', 'place_of_visit', 'duration_of_visit', 'start_date', 'end_date', 'overall_budget'
+    ])
+    places = {}
+
+    def encode(names):
+        return np.array([places.setdefault(name, len(places)) for name in names], dtype=np.int32)
+
+    city_codes, city_names = pd.factorize(users_df['city_of_residence'])
+    offsets = [0]
+    values = []
+    for raw in users_df['places_visited'].tolist():
+        if not pd.isna(raw):
+            values.extend(normalize_place(p) for p in str(raw).split(',') if p.strip())
+        offsets.append(len(values))
+
+    users = {
+        "user_id": users_df['user_id'].to_numpy(dtype=np.int64),
+        "age": users_df['age'].to_numpy(dtype=float),
+        "city": city_codes.astype(np.int32),
+        "recent_place": encode(users_df['recently_visited_place'].map(normalize_place)),
+        "places_offsets": np.asarray(offsets, dtype=np.int64),
+        "places_values": encode(values),
+    }
+    trips = {
+        "user_id": trips_df['user_id'].to_numpy(dtype=np.int64),
+        "place": encode(trips_df['place_of_visit'].map(normalize_place)),
+        "start_day": parse_days(trips_df['start_date']),
+        "end_day": parse_days(trips_df['end_date']),
+        "duration": pd.to_numeric(trips_df['duration_of_visit'], errors='coerce')
+                      .fillna(-1).to_numpy(dtype=np.int32),
+        "budget": parse_amounts(trips_df['overall_budget']),
+    }
+
+    os.makedirs(out_dir, exist_ok=True)
+    for column, array in users.items():
+        np.save(os.path.join(out_dir, f"users_{column}.npy"), array)
+    for column, array in trips.items():
+        np.save(os.path.join(out_dir, f"trips_{column}.npy"), array)
+    meta = {
+        "data_version": csv_data_version(users_file, trips_file),
+        "places": list(places),
+        "cities": list(city_names),
+        "users": len(users_df),
+        "trips": len(trips_df),
+    }
+    with open(os.path.join(out_dir, META_FILE), "w") as f:
+        json.dump(meta, f)
+    return meta
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert users/trips CSVs to the columnar store.")
+    parser.add_argument("--users", default="data/users.csv")
+    parser.add_argument("--trips", default="data/trips.csv")
+    parser.add_argument("--out", default="data/columnar")
+    args = parser.parse_args(argv)
+    meta = convert_csv(args.users, args.trips, args.out)
+    print(f"Wrote {meta['users']} users and {meta['trips']} trips to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scoring import top_places
+
+# Pending co-occurrence changes are folded into the matrix once they outnumber this share of its entries
+FOLD_FRACTION = 0.25
+MIN_FOLD_ENTRIES = 4096
+
+
+def _padded(matrix, shape):
+    """CSR matrix grown to shape with empty rows and columns, sharing the original's arrays."""
+    indptr = np.concatenate([matrix.indptr, np.full(shape[0] - matrix.shape[0], matrix.indptr[-1])])
+    return sp.csr_matrix((matrix.data, matrix.indices, indptr), shape=shape)
+
+
+class PlaceCooccurrence:
+    """
+    Sparse user x place visit matrix and the place x place co-occurrence it implies.
+    - visits[u, p]: recency weight of user u's latest visit to p, 2 ** ((day - ref_day) / half_life_days)
+      with ref_day the latest visit day at build time; undated visits weigh as much as the oldest dated one
+    - cooc = visits.T @ visits without its diagonal: cooc[p, q] sums, over the users who
+      visited both p and q, the product of their visit weights
+    A user's co-visitation scores are their visits row times cooc, a sparse row-sum over
+    their own places, so scoring does not depend on the number of users. Weights are
+    relative to a fixed day, so visits added later never rescale the existing entries
+    (only a visit older than every visit at build time would move the undated weight;
+    added incrementally, it keeps the build's until the next full build).
+
+    add_visits/set_user_visits change one user's row in O(places of the user ^ 2) and
+    record the co-occurrence change as pending (row, col, value) triples that queries
+    add on top of the matrix; they are folded into it once they pile up.
+    """
+
+    def __init__(self, place_names, user_rows, place_codes, days, dated, n_users, half_life_days=365.0):
+        self.place_names = list(place_names)
+        self.code_of_place = {name: code for code, name in enumerate(self.place_names)}
+        self.half_life_days = half_life_days
+        self.n_users = n_users
+        user_rows = np.asarray(user_rows, dtype=np.int64)
+        place_codes = np.asarray(place_codes, dtype=np.int64)
+        days = np.asarray(days, dtype=np.int64)
+        dated = np.asarray(dated, dtype=bool)
+        self.ref_day = int(days[dated].max()) if dated.any() else 0
+        self.undated_weight = 1.0
+        if dated.any():
+            self.undated_weight = float(self.weights(days[dated].min(keepdims=True), np.ones(1, dtype=bool))[0])
+
+        # One entry per (user, place): the weight of the latest visit
+        n_places = len(self.place_names)
+        keep = user_rows >= 0
+        user_rows, place_codes = user_rows[keep], place_codes[keep]
+        weights = self.weights(days[keep], dated[keep])
+        keys = user_rows * max(n_places, 1) + place_codes
+        order = np.lexsort((-weights, keys))
+        _, first = np.unique(keys[order], return_index=True)
+        latest = order[first]
+        self.visits = sp.csr_matrix(
+            (weights[latest], (user_rows[latest], place_codes[latest])), shape=(n_users, n_places)
+        )
+        cooc = (self.visits.T @ self.visits).tocsr()
+        self.cooc = (cooc - sp.diags(cooc.diagonal())).tocsr()
+        self.cooc.eliminate_zeros()
+
+        self._rows = {}
+        self._pending = ([], [], [])
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_index(cls, index, visited_rows, visited_places, half_life_days=365.0):
+        """
+        Matrix over a LookupIndex's users: its trips (dated by end day) plus undated
+        places_visited entries given as user rows and normalized place names.
+        """
+        place_names = list(index.place_names)
+        codes = pd.Index(place_names).get_indexer(visited_places)
+        new = codes < 0
+        extra_codes, extra_names = pd.factorize(np.asarray(visited_places, dtype=object)[new])
+        codes[new] = len(place_names) + extra_codes
+        n_visited = len(codes)
+        return cls(
+            place_names + list(extra_names),
+            np.concatenate([index.trip_user_rows, np.asarray(visited_rows, dtype=np.int64)]),
+            np.concatenate([index.place_codes, codes]),
+            np.concatenate([index.end_days, np.zeros(n_visited, dtype=np.int64)]),
+            np.concatenate([index.has_end_date, np.zeros(n_visited, dtype=bool)]),
+            len(index.user_ids), half_life_days,
+        )
+
+    def weights(self, days, dated):
+        days = np.asarray(days, dtype=np.int64)
+        return np.where(dated, np.exp2((days - self.ref_day) / self.half_life_days), self.undated_weight)
+
+    def _code(self, place):
+        code = self.code_of_place.get(place)
+        if code is None:
+            code = self.code_of_place[place] = len(self.place_names)
+            self.place_names.append(place)
+        return code
+
+    def _row(self, user_row):
+        """{place code: weight} of one user, overlay first."""
+        row = self._rows.get(user_row)
+        if row is not None:
+            return row
+        if user_row >= self.visits.shape[0]:
+            return {}
+        start, end = self.visits.indptr[user_row], self.visits.indptr[user_row + 1]
+        return dict(zip(self.visits.indices[start:end].tolist(), self.visits.data[start:end].tolist()))
+
+    def _set_row(self, user_row, new):
+        """Replaces one user's row; the co-occurrence change is new new^T - old old^T off the diagonal."""
+        old = self._row(user_row)
+        codes = list(set(old) | set(new))
+        rows, cols, values = self._pending
+        for p in codes:
+            for q in codes:
+                if p != q:
+                    delta = new.get(p, 0.0) * new.get(q, 0.0) - old.get(p, 0.0) * old.get(q, 0.0)
+                    if delta:
+                        rows.append(p)
+                        cols.append(q)
+                        values.append(delta)
+        self._rows[user_row] = new
+        self.n_users = max(self.n_users, user_row + 1)
+        if len(values) > max(MIN_FOLD_ENTRIES, FOLD_FRACTION * self.cooc.nnz):
+            self._fold()
+
+    def add_visits(self, user_rows, places, days, dated):
+        """Adds visits (normalized place names) of new or existing users; a user keeps each place's latest weight."""
+        weights = self.weights(days, dated).tolist()
+        with self._lock:
+            changed = {}
+            for user_row, place, weight in zip(user_rows, places, weights):
+                row = changed.get(user_row)
+                if row is None:
+                    row = changed[user_row] = dict(self._row(user_row))
+                code = self._code(place)
+                row[code] = max(row.get(code, 0.0), weight)
+            for user_row, row in changed.items():
+                self._set_row(user_row, row)
+
+    def set_user_visits(self, user_row, places, days, dated):
+        """Replaces a user's visits (latest weight per place); no visits removes the user."""
+        weights = self.weights(days, dated).tolist()
+        with self._lock:
+            row = {}
+            for place, weight in zip(places, weights):
+                code = self._code(place)
+                row[code] = max(row.get(code, 0.0), weight)
+            self._set_row(user_row, row)
+
+    def _fold(self):
+        # New matrices rather than in-place edits: queries use the old ones outside the lock
+        n_places = len(self.place_names)
+        rows, cols, values = self._pending
+        cooc = _padded(self.cooc, (n_places, n_places))
+        cooc = (cooc + sp.csr_matrix((values, (rows, cols)), shape=cooc.shape)).tocsr()
+        cooc.eliminate_zeros()
+        self.cooc = cooc
+
+        touched = np.fromiter(self._rows, dtype=np.int64, count=len(self._rows))
+        keep = np.ones(self.n_users)
+        keep[touched] = 0
+        entries = [(user_row, code, weight) for user_row, row in self._rows.items() for code, weight in row.items()]
+        replaced = sp.csr_matrix(
+            ([e[2] for e in entries], ([e[0] for e in entries], [e[1] for e in entries])),
+            shape=(self.n_users, n_places),
+        )
+        self.visits = (sp.diags(keep) @ _padded(self.visits, replaced.shape) + replaced).tocsr()
+        self._rows = {}
+        self._pending = ([], [], [])
+
+    def _scores(self, row):
+        """Co-visitation score of every place for a {place code: weight} row."""
+        with self._lock:
+            cooc = self.cooc
+            n_places = len(self.place_names)
+            rows, cols, values = (np.asarray(a) for a in self._pending)
+        codes = np.fromiter(row, dtype=np.int64, count=len(row))
+        weights = np.fromiter(row.values(), dtype=float, count=len(row))
+        scores = np.zeros(n_places)
+        in_matrix = codes < cooc.shape[0]
+        scores[:cooc.shape[0]] = cooc[codes[in_matrix]].T @ weights[in_matrix]
+        if len(values):
+            dense = np.zeros(n_places)
+            dense[codes] = weights
+            scores += np.bincount(cols.astype(np.int64), weights=values * dense[rows.astype(np.int64)], minlength=n_places)
+        return scores
+
+    def _rank(self, row, exclude_places, top_n, allowed_places=None):
+        if not row:
+            return []
+        scores = self._scores(row)
+        excluded = np.zeros(len(scores), dtype=bool)
+        excluded[[self.code_of_place[p] for p in exclude_places if p in self.code_of_place]] = True
+        if allowed_places is not None:
+            allowed = np.zeros(len(scores), dtype=bool)
+            allowed[[self.code_of_place[p] for p in allowed_places if p in self.code_of_place]] = True
+            excluded |= ~allowed
+        excluded[list(row)] = True
+        candidates = np.flatnonzero((scores > 1e-12) & ~excluded)
+        if len(candidates) == 0:
+            return []
+        # Ties go to the place seen first
+        codes = top_places(scores, np.arange(len(scores)), candidates, top_n)
+        return [self.place_names[code] for code in codes.tolist()]
+
+    def rank_user(self, user_row, exclude_places, top_n, allowed_places=None):
+        """
+        Top places co-visited with the user's own (recency-weighted) places, which are
+        excluded; only allowed_places are candidates when given.
+        """
+        with self._lock:
+            row = dict(self._row(user_row))
+        return self._rank(row, exclude_places, top_n, allowed_places)
+
+    def rank_places(self, places, exclude_places, top_n):
+        """Top places co-visited with `places` (equally weighted), which are excluded."""
+        row = {self.code_of_place[p]: 1.0 for p in places if p in self.code_of_place}
+        return self._rank(row, exclude_places, top_n)
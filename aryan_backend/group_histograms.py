@@ -0,0 +1,195 @@
+import numpy as np
+from scoring import top_places
+
+
+class GroupHistograms:
+    """
+    Load-time place histograms for user groups keyed by a small integer
+    (age, city code, recent place code). For group g and place p:
+    - count[g, p]: trips, dated[g, p]: trips with an end date, day_sum[g, p]: sum of those end days
+    - first_pos[g, p]: first trip row, used to break score ties like the direct scan does
+    and per group the min/max end day with the number of trips on each.
+
+    A group's score for p is sum(1 + (d - min) / range) over its trips, which is
+    (count * range + day_sum - dated * min) / range, so ranking by that integer
+    numerator is exact and only needs these aggregates. With prefix=True the
+    additive arrays are cumulative over g, so any contiguous range of groups (an
+    age window) costs O(places) instead of O(users).
+    """
+
+    def __init__(self, index, user_groups, n_groups, prefix=False):
+        self.n_groups = n_groups
+        self.n_places = n_places = len(index.place_names)
+        self.prefix = prefix
+
+        trip_rows = index.trip_user_rows
+        trip_groups = np.where(trip_rows >= 0, user_groups[np.maximum(trip_rows, 0)], -1)
+        grouped = trip_groups >= 0
+        groups = trip_groups[grouped]
+        codes = index.place_codes[grouped]
+        days = index.end_days[grouped]
+        valid = index.has_end_date[grouped]
+        rows = np.flatnonzero(grouped)
+        flat = groups.astype(np.int64) * n_places + codes
+        size = n_groups * n_places
+
+        count = np.bincount(flat, minlength=size).reshape(n_groups, n_places)
+        dated = np.bincount(flat[valid], minlength=size).reshape(n_groups, n_places)
+        # Float sums of integer days are exact well past any realistic trip count
+        day_sum = np.rint(
+            np.bincount(flat[valid], weights=days[valid], minlength=size)
+        ).astype(np.int64).reshape(n_groups, n_places)
+        if prefix:
+            count, dated, day_sum = (np.cumsum(a, axis=0) for a in (count, dated, day_sum))
+        self.count, self.dated, self.day_sum = count, dated, day_sum
+
+        self.first_pos = np.full(size, np.iinfo(np.int64).max, dtype=np.int64)
+        present, first_idx = np.unique(flat, return_index=True)
+        self.first_pos[present] = rows[first_idx]
+        self.first_pos = self.first_pos.reshape(n_groups, n_places)
+
+        no_day = np.iinfo(np.int64).max
+        self.min_day = np.full(n_groups, no_day, dtype=np.int64)
+        self.max_day = np.full(n_groups, -no_day, dtype=np.int64)
+        np.minimum.at(self.min_day, groups[valid], days[valid])
+        np.maximum.at(self.max_day, groups[valid], days[valid])
+        self.min_count = np.bincount(
+            groups[valid][days[valid] == self.min_day[groups[valid]]], minlength=n_groups
+        )
+        self.max_count = np.bincount(
+            groups[valid][days[valid] == self.max_day[groups[valid]]], minlength=n_groups
+        )
+
+    @classmethod
+    def by_age(cls, index):
+        """Groups by integer age, cumulative so any age window is one subtraction; None for fractional ages."""
+        ages = index.ages
+        known = ~np.isnan(ages)
+        if not known.any() or np.any(ages[known] != np.floor(ages[known])):
+            return None
+        hist_ages = np.where(known, ages, -1).astype(np.int64)
+        base = int(hist_ages[known].min())
+        user_groups = np.where(known, hist_ages - base, -1)
+        hist = cls(index, user_groups, int(hist_ages[known].max()) - base + 1, prefix=True)
+        hist.base = base
+        return hist
+
+    @classmethod
+    def by_code(cls, index, user_codes, n_codes):
+        """Groups by a dictionary code per user (-1 for none)."""
+        return cls(index, np.asarray(user_codes, dtype=np.int64), n_codes)
+
+    def _resize(self, n_groups, n_places, shift=0):
+        """Grows to n_groups x n_places, with existing groups moved down by shift."""
+        no_day = np.iinfo(np.int64).max
+        rows = slice(shift, shift + self.n_groups)
+        cols = slice(0, self.n_places)
+
+        def grow(array, fill, cumulative=False):
+            grown = np.full((n_groups, n_places), fill, dtype=array.dtype)
+            grown[rows, cols] = array
+            if cumulative:
+                # Groups added after the last one carry its running totals
+                grown[shift + self.n_groups:, cols] = array[-1] if self.n_groups else 0
+            return grown
+
+        self.count = grow(self.count, 0, self.prefix)
+        self.dated = grow(self.dated, 0, self.prefix)
+        self.day_sum = grow(self.day_sum, 0, self.prefix)
+        self.first_pos = grow(self.first_pos, no_day)
+        for name, fill in (("min_day", no_day), ("max_day", -no_day), ("min_count", 0), ("max_count", 0)):
+            grown = np.full(n_groups, fill, dtype=np.int64)
+            grown[rows] = getattr(self, name)
+            setattr(self, name, grown)
+        self.n_groups, self.n_places = n_groups, n_places
+
+    def group_of_age(self, age):
+        """Group of an integer age (by_age histograms), adding groups when it is out of range."""
+        group = int(age) - self.base
+        if group < 0:
+            self._resize(self.n_groups - group, self.n_places, shift=-group)
+            self.base += group
+            group = 0
+        elif group >= self.n_groups:
+            self._resize(group + 1, self.n_places)
+        return group
+
+    def add_trips(self, index, positions, groups):
+        """
+        Adds trips (row positions in index's trip columns) in place, each in the given
+        group (-1 for none); cost is O(trips) plus O(groups) per trip with prefix=True.
+        """
+        n_groups = max([self.n_groups] + [g + 1 for g in groups])
+        if n_groups > self.n_groups or len(index.place_names) > self.n_places:
+            self._resize(n_groups, len(index.place_names))
+        for pos, group in zip(positions, groups):
+            if group < 0:
+                continue
+            code = index.place_codes[pos]
+            rows = slice(group, None) if self.prefix else group
+            self.count[rows, code] += 1
+            self.first_pos[group, code] = min(self.first_pos[group, code], pos)
+            if not index.has_end_date[pos]:
+                continue
+            day = int(index.end_days[pos])
+            self.dated[rows, code] += 1
+            self.day_sum[rows, code] += day
+            if day < self.min_day[group]:
+                self.min_day[group], self.min_count[group] = day, 0
+            if day == self.min_day[group]:
+                self.min_count[group] += 1
+            if day > self.max_day[group]:
+                self.max_day[group], self.max_count[group] = day, 0
+            if day == self.max_day[group]:
+                self.max_count[group] += 1
+
+    def _range(self, array, lo, hi):
+        if not self.prefix:
+            return array[lo:hi + 1].sum(axis=0) if hi > lo else array[lo].copy()
+        return array[hi] - array[lo - 1] if lo > 0 else array[hi].copy()
+
+    def rank(self, index, lo, hi, user_id, subtract_user, exclude_places, top_n, allowed=None):
+        """
+        Top places for the union of groups lo..hi, optionally without the user's own trips,
+        among the allowed place codes (a mask) when given.
+        Returns None when removing the user's trips would move the date range; callers
+        then fall back to scanning the group's trips.
+        """
+        lo, hi = max(lo, 0), min(hi, self.n_groups - 1)
+        if lo > hi:
+            return []
+        count = self._range(self.count, lo, hi)
+        dated = self._range(self.dated, lo, hi)
+        day_sum = self._range(self.day_sum, lo, hi)
+        min_days, max_days = self.min_day[lo:hi + 1], self.max_day[lo:hi + 1]
+        min_day, max_day = min_days.min(), max_days.max()
+        has_days = max_day >= min_day
+        min_count = self.min_count[lo:hi + 1][min_days == min_day].sum()
+        max_count = self.max_count[lo:hi + 1][max_days == max_day].sum()
+
+        rows = index.user_trip_positions(user_id) if subtract_user else None
+        if rows is not None:
+            codes = index.place_codes[rows]
+            valid = index.has_end_date[rows]
+            days = index.end_days[rows][valid]
+            np.subtract.at(count, codes, 1)
+            np.subtract.at(dated, codes[valid], 1)
+            np.subtract.at(day_sum, codes[valid], days)
+            if has_days and ((days == min_day).sum() >= min_count or (days == max_day).sum() >= max_count):
+                return None
+
+        if not has_days:
+            min_day, day_range = 0, 1
+        else:
+            day_range = max(int(max_day - min_day), 1)
+        numerator = count * day_range + day_sum - dated * min_day
+        first_seen = self.first_pos[lo:hi + 1].min(axis=0)
+
+        excluded = np.zeros(self.n_places, dtype=bool)
+        excluded[index.place_codes_for(exclude_places)] = True
+        if allowed is not None:
+            excluded |= ~allowed[:self.n_places]
+        candidates = np.flatnonzero((count > 0) & ~excluded)
+        if len(candidates) == 0:
+            return []
+        return index.place_names[top_places(numerator, first_seen, candidates, top_n)].tolist()
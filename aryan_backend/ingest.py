@@ -0,0 +1,325 @@
+"""
+Snapshots of the CSV recommender's data and incremental ingest into them.
+
+A Snapshot bundles everything a request reads (lookup index, group histograms,
+per-place trip statistics, trending counters, optional place co-occurrence matrix, data version). Requests hold snapshot.lock.reading() while they use it; ingest
+updates it in place under lock.writing(), in time proportional to the records
+added; a reload builds a new Snapshot and replaces the reference, so requests
+already running keep a consistent view of the old one. Rows another process appended
+to the data files are read back from where this one stopped (read_appended) and added
+the same way, so pre-forked workers follow each other's ingests without a reload.
+"""
+import csv
+import fcntl
+import io
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from columnar_store import parse_amounts
+from group_histograms import GroupHistograms
+from lookup_index import normalize_place
+
+DATE_FORMAT = "%Y-%m-%d"
+
+
+class ReadWriteLock:
+    """Many readers or one writer; a waiting writer holds back new readers so ingest is not starved."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def reading(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def writing(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class Snapshot:
+    """
+    Lookup index, group histograms, place statistics, trending counters, co-occurrence
+    matrix and data version, served together.
+    """
+
+    def __init__(self, index, data_version, place_stats, trending, cooccurrence=None):
+        self.index = index
+        self.data_version = data_version
+        self.place_stats = place_stats
+        self.trending = trending
+        # PlaceCooccurrence for COVISIT_MODE=cooccurrence, else None
+        self.cooccurrence = cooccurrence
+        # Per-group place aggregates: age windows, recent-place groups and city groups are
+        # scored from these in O(places) instead of scanning the group's trips
+        self.age_histograms = GroupHistograms.by_age(index)
+        self.recent_histograms = GroupHistograms.by_code(index, index.user_recent, len(index.recent_names))
+        self.city_histograms = GroupHistograms.by_code(index, index.user_cities, len(index.city_names))
+        self.lock = ReadWriteLock()
+
+    def add_users(self, users):
+        """
+        Adds (user_id, age, city, normalized recent place, normalized places visited) records;
+        users alone change no histogram.
+        """
+        with self.lock.writing():
+            rows = self.index.add_users(users)
+            if self.cooccurrence is not None:
+                visited = [(row, place) for row, user in zip(rows, users) for place in user[4]]
+                self.cooccurrence.add_visits(
+                    [row for row, _ in visited], [place for _, place in visited],
+                    np.zeros(len(visited), dtype=np.int64), np.zeros(len(visited), dtype=bool),
+                )
+            return rows
+
+    def add_trips(self, trips):
+        """
+        Adds (user_id, normalized place, end day, duration, budget) records of known users
+        to the index, histograms, place statistics and trending counters.
+        """
+        with self.lock.writing():
+            index = self.index
+            positions = index.add_trips(trips)
+            rows = index.trip_user_rows[positions]
+            self.place_stats.add_trips(
+                index.place_codes[positions].tolist(), [trip[3] for trip in trips], [trip[4] for trip in trips],
+                index.end_days[positions].tolist(), index.has_end_date[positions].tolist(), len(index.place_names),
+            )
+            cities = [index.city_names[code] if code >= 0 else "" for code in index.user_cities[rows].tolist()]
+            self.trending.add_trips(
+                [trip[1] for trip in trips], index.end_days[positions], index.has_end_date[positions],
+                [normalize_place(city) for city in cities], index.ages[rows],
+            )
+            self.recent_histograms.add_trips(index, positions, index.user_recent[rows].tolist())
+            self.city_histograms.add_trips(index, positions, index.user_cities[rows].tolist())
+            if self.cooccurrence is not None:
+                self.cooccurrence.add_visits(
+                    rows.tolist(), [trip[1] for trip in trips],
+                    index.end_days[positions], index.has_end_date[positions],
+                )
+            if self.age_histograms is None:
+                return positions
+            ages = index.ages[rows]
+            known = ~np.isnan(ages)
+            if np.any(ages[known] != np.floor(ages[known])):
+                # Fractional ages cannot be grouped; age windows fall back to scanning
+                self.age_histograms = None
+                return positions
+            hist = self.age_histograms
+            if known.any():
+                hist.group_of_age(ages[known].min())
+                hist.group_of_age(ages[known].max())
+            groups = np.where(known, np.nan_to_num(ages) - hist.base, -1).astype(np.int64)
+            # Called even when no age is known so the histogram also covers new place codes
+            hist.add_trips(index, positions, groups.tolist())
+            return positions
+
+
+# --- Request parsing ---
+def _records(payload, key):
+    """Accepts one record object, a list of them, or {key: [...]}."""
+    if isinstance(payload, dict) and key in payload:
+        payload = payload[key]
+    if isinstance(payload, dict):
+        payload = [payload]
+    if not isinstance(payload, list) or not payload or not all(isinstance(r, dict) for r in payload):
+        raise ValueError(f"Expected a {key[:-1]} object or a non-empty list of them")
+    return payload
+
+
+def _optional_str(record, field):
+    value = record.get(field)
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f"{field} must be a string")
+    return value
+
+
+def parse_users(payload, index):
+    """Validates POST /users records; returns (index records, CSV rows)."""
+    users, rows = [], []
+    seen = set()
+    for record in _records(payload, "users"):
+        user_id = record.get("user_id")
+        if not isinstance(user_id, int) or isinstance(user_id, bool) or user_id < 0:
+            raise ValueError("user_id must be a non-negative integer")
+        if user_id in seen or index.row(user_id) is not None:
+            raise ValueError(f"user_id {user_id} already exists")
+        seen.add(user_id)
+        age = record.get("age")
+        if age is not None and (not isinstance(age, (int, float)) or isinstance(age, bool)):
+            raise ValueError("age must be a number")
+        city = _optional_str(record, "city_of_residence")
+        recent = _optional_str(record, "recently_visited_place")
+        if recent is None:
+            raise ValueError("recently_visited_place is required")
+        # Comma-separated, as in the data file
+        visited = _optional_str(record, "places_visited") or ""
+        places = [normalize_place(p) for p in visited.split(',') if p.strip()]
+        users.append((user_id, age, city, normalize_place(recent), places))
+        rows.append(record)
+    return users, rows
+
+
+def _day(value, field):
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"{field} must be a date string")
+    # Same format as the data files, so a full reload parses the appended row identically
+    date = pd.to_datetime(value, format=DATE_FORMAT, errors='coerce')
+    if pd.isna(date):
+        raise ValueError(f"{field} must be a YYYY-MM-DD date")
+    return int(np.datetime64(date.date(), 'D').astype(np.int64))
+
+
+def _number(value, field):
+    """Non-negative number or None."""
+    if value is None:
+        return None
+    if not isinstance(value, (int, float, np.integer)) or isinstance(value, bool) or not value >= 0:
+        raise ValueError(f"{field} must be a non-negative number")
+    return float(value)
+
+
+def parse_trips(payload, index):
+    """Validates POST /trips records; returns (index records, CSV rows)."""
+    trips, rows = [], []
+    for record in _records(payload, "trips"):
+        user_id = record.get("user_id")
+        if not isinstance(user_id, int) or isinstance(user_id, bool):
+            raise ValueError("user_id must be an integer")
+        if index.row(user_id) is None:
+            raise ValueError(f"Unknown user_id {user_id}")
+        place = _optional_str(record, "place_of_visit")
+        if not place or not place.strip():
+            raise ValueError("place_of_visit is required")
+        _day(record.get("start_date"), "start_date")
+        end_day = _day(record.get("end_date"), "end_date")
+        duration = _number(record.get("duration_of_visit"), "duration_of_visit")
+        budget = record.get("overall_budget")
+        if isinstance(budget, str):
+            # "INR 47365", parsed as the data file's budgets are
+            budget = parse_amounts([budget])[0]
+            if budget < 0:
+                raise ValueError("overall_budget must contain an amount")
+        budget = _number(budget, "overall_budget")
+        if budget is not None and not isinstance(record["overall_budget"], str):
+            # The data file holds whole amounts ("200000.0" would reload as 2000000)
+            budget = float(round(budget))
+            record = dict(record, overall_budget=int(budget))
+        trips.append((user_id, normalize_place(place), end_day, duration, budget))
+        rows.append(record)
+    return trips, rows
+
+
+# --- CSV persistence ---
+@contextmanager
+def locked_file(path):
+    """Exclusive advisory lock on a data file, shared by every process appending to it."""
+    with open(path, "a+", newline="", encoding="utf-8", errors="replace") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield f
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _last_row(f, header):
+    """Last data row of an open CSV as a dict (None if it has none), read from the end of the file."""
+    size = f.seek(0, 2)
+    f.seek(max(size - 65536, 0))
+    lines = [line for line in f.read().splitlines() if line.strip()]
+    if len(lines) < 2 and size <= 65536:
+        return None
+    return next(csv.DictReader(lines[-1:], fieldnames=header))
+
+
+def append_csv_rows(f, rows, id_field=None):
+    """
+    Appends dict rows to an open CSV using its header; unknown fields are dropped.
+    Rows without id_field get consecutive ids after the file's last row.
+    """
+    f.seek(0)
+    header = next(csv.reader(f))
+    if id_field is not None and any(row.get(id_field) is None for row in rows):
+        last = _last_row(f, header)
+        next_id = int(last[id_field]) + 1 if last else 1
+        for row in rows:
+            if row.get(id_field) is None:
+                row[id_field] = next_id
+                next_id += 1
+    size = f.seek(0, 2)
+    f.seek(max(size - 1, 0))
+    if size and f.read(1) != "\n":
+        f.write("\n")
+    writer = csv.DictWriter(f, fieldnames=header, extrasaction="ignore", lineterminator="\n")
+    writer.writerows(rows)
+    f.flush()
+
+
+def read_appended(path, offset):
+    """Rows appended to a CSV past byte offset, parsed under the file's header; hold its lock."""
+    with open(path, "rb") as f:
+        header = f.readline()
+        f.seek(offset)
+        tail = f.read()
+    return pd.read_csv(io.BytesIO(header + tail), encoding="utf-8", encoding_errors="replace")
+
+
+def users_from_frame(users_df):
+    """Index records of users.csv rows, parsed as a full load parses them."""
+    users = []
+    for record in users_df.to_dict("records"):
+        age, city, visited = record.get("age"), record.get("city_of_residence"), record.get("places_visited")
+        users.append((
+            int(record["user_id"]),
+            None if pd.isna(age) else float(age),
+            None if pd.isna(city) else city,
+            normalize_place(record.get("recently_visited_place")),
+            [] if pd.isna(visited) else [normalize_place(p) for p in str(visited).split(',') if p.strip()],
+        ))
+    return users
+
+
+def trips_from_frame(trips_df):
+    """Index records of trips.csv rows, parsed as a full load parses them."""
+    missing = pd.Series(np.nan, index=trips_df.index)
+    end_dates = pd.to_datetime(trips_df.get("end_date", missing), errors='coerce')
+    durations = pd.to_numeric(trips_df.get("duration_of_visit", missing), errors='coerce')
+    budgets = parse_amounts(trips_df.get("overall_budget", missing))
+    return [
+        (
+            int(user_id), normalize_place(place),
+            None if pd.isna(end_date) else int(np.datetime64(end_date.date(), 'D').astype(np.int64)),
+            float(duration) if duration >= 0 else None, float(budget) if budget >= 0 else None,
+        )
+        for user_id, place, end_date, duration, budget in zip(
+            trips_df["user_id"], trips_df["place_of_visit"], end_dates, durations, budgets
+        )
+    ]
@@ -0,0 +1,187 @@
+"""
+Metrics and debug logging shared by both recommenders.
+
+- Counter and Histogram are labelled, thread-safe and process-local; install(app)
+  adds per-endpoint request latency histograms and a Prometheus text /metrics route.
+- stage(name) times one stage of a request into recommend_stage_seconds{stage=name}.
+- debug(...) lines are logged for a sampled share of requests (DEBUG_SAMPLE_RATE) and
+  only when LOG_LEVEL is DEBUG; otherwise each call is one context variable read.
+"""
+import bisect
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, request
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+DEBUG_SAMPLE_RATE = float(os.environ.get("DEBUG_SAMPLE_RATE", "0.01"))
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+log = logging.getLogger("recommender")
+_debug_sampled = contextvars.ContextVar("debug_sampled", default=False)
+
+
+def configure_logging():
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+
+def sample_debug():
+    """Decides once per request whether its debug lines are written."""
+    sampled = log.isEnabledFor(logging.DEBUG) and random.random() < DEBUG_SAMPLE_RATE
+    _debug_sampled.set(sampled)
+    return sampled
+
+
+def debug(msg, *args):
+    """Debug line for sampled requests; arguments are only formatted when it is written."""
+    if _debug_sampled.get():
+        log.debug(msg, *args)
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, total in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, values)} {total}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += n
+                    labels = _label_text(self.labels + ("le",), values + (bound,))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _label_text(self.labels, values)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text, labels=()):
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """Registers fn() -> list of exposition lines, read at scrape time (e.g. cache stats)."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for fn in self._collectors:
+            lines.extend(fn())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+request_seconds = registry.histogram(
+    "http_request_duration_seconds", "Request latency by endpoint and status.", ("endpoint", "status")
+)
+stage_seconds = registry.histogram(
+    "recommend_stage_seconds", "Time spent in each stage of a recommendation request.", ("stage",)
+)
+
+
+@contextmanager
+def stage(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds.observe(time.perf_counter() - started, name)
+
+
+def cache_collector(prefix, cache):
+    """Exposes a ResultCache's counters and size."""
+    def collect():
+        stats = cache.stats()
+        lines = []
+        for key in ("hits", "misses", "evictions"):
+            name = f"{prefix}_{key}_total"
+            lines += [f"# TYPE {name} counter", f"{name} {stats[key]}"]
+        lines += [f"# TYPE {prefix}_entries gauge", f"{prefix}_entries {stats['size']}"]
+        return lines
+    return collect
+
+
+def install(app):
+    """Adds request timing, per-request debug sampling and GET /metrics to a Flask app."""
+
+    @app.before_request
+    def _start_request():
+        g.request_started = time.perf_counter()
+        sample_debug()
+
+    @app.after_request
+    def _finish_request(response):
+        started = getattr(g, "request_started", None)
+        if started is not None:
+            request_seconds.observe(
+                time.perf_counter() - started, request.url_rule.rule if request.url_rule else "unmatched",
+                response.status_code
+            )
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4")
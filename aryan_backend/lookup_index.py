@@ -0,0 +1,296 @@
+import numpy as np
+import pandas as pd
+from collections import defaultdict, namedtuple
+
+
+def normalize_place(s):
+    return str(s).strip().lower()
+
+
+UserRecord = namedtuple('UserRecord', ['user_id', 'age', 'city_of_residence', 'recently_visited_place'])
+
+
+def _csr(keys, n_keys):
+    """Row positions grouped by key (-1 keys dropped), stable within a key, plus per-key offsets."""
+    keyed = np.flatnonzero(keys >= 0)
+    order = keyed[np.argsort(keys[keyed], kind='stable')]
+    offsets = np.zeros(n_keys + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys[keyed], minlength=n_keys), out=offsets[1:])
+    return order, offsets
+
+
+class LookupIndex:
+    """
+    Load-time lookup tables over the users and trips columns.
+    - user_id -> user row, city -> user rows, recent place -> user rows
+    - user row -> trip row positions and visited place codes
+    - user ids sorted by age for range queries
+    - trips as columns: dictionary-encoded places and integer end days
+    Every lookup is O(log users) or O(group size) instead of a full frame scan.
+    Per-user and per-trip tables are flat NumPy arrays (sorted keys, or positions
+    plus offsets), never per-user Python objects, so forked workers share them
+    without copy-on-write faults; only the small place and city dictionaries are dicts.
+    Build it with from_frames (CSV DataFrames) or from_columnar (columnar_store).
+
+    add_users/add_trips ingest records in place in time proportional to the records:
+    columns grow inside over-allocated buffers, and the new rows are kept in small
+    overlays (extra_*) next to the sorted and offset tables until the next full load.
+    Callers serialize them against readers (see ingest.Snapshot).
+    """
+
+    def __init__(self, user_ids, ages, user_cities, city_names, user_recent, recent_names,
+                 trip_user_ids, place_codes, place_names, end_days, has_end_date):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.ages = ages
+        self.user_cities = user_cities
+        self.city_names = list(city_names)
+        self.user_recent = user_recent
+        self.recent_names = list(recent_names)
+        n_users = len(self.user_ids)
+        self._buffers = {}
+        self.extra_ids = {}
+        self.extra_trips = {}
+        self.extra_city_rows = defaultdict(list)
+        self.extra_recent_rows = defaultdict(list)
+        self.extra_age_rows = []
+
+        # Sorted distinct ids with their first row: get_user_record always returned the first match
+        order = np.argsort(self.user_ids, kind='stable')
+        sorted_ids = self.user_ids[order]
+        first = np.ones(n_users, dtype=bool)
+        first[1:] = sorted_ids[1:] != sorted_ids[:-1]
+        self.id_keys = sorted_ids[first]
+        self.id_rows = order[first]
+
+        self.city_code = {name: code for code, name in enumerate(city_names)}
+        self.city_rows, self.city_offsets = _csr(np.asarray(user_cities, dtype=np.int64), len(city_names))
+        self.recent_code = {name: code for code, name in enumerate(recent_names)}
+        self.recent_rows, self.recent_offsets = _csr(np.asarray(user_recent, dtype=np.int64), len(recent_names))
+
+        self.place_codes = place_codes
+        self.place_names = np.asarray(place_names, dtype=object)
+        self.code_of_place = {name: code for code, name in enumerate(self.place_names)}
+        self.end_days = end_days
+        self.has_end_date = has_end_date
+
+        self.trip_user_rows = self.rows_of(np.asarray(trip_user_ids, dtype=np.int64))
+        self.trip_order, self.trip_offsets = _csr(self.trip_user_rows, n_users)
+
+        # Distinct (user row, place code) pairs of the trips, grouped by user row
+        n_places = max(len(self.place_names), 1)
+        has_user = self.trip_user_rows >= 0
+        pairs = np.unique(self.trip_user_rows[has_user] * n_places + np.asarray(place_codes)[has_user])
+        self.visited_codes = (pairs % n_places).astype(np.int32)
+        self.visited_offsets = np.zeros(n_users + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pairs // n_places, minlength=n_users), out=self.visited_offsets[1:])
+
+        has_age = ~np.isnan(ages)
+        order = np.argsort(ages[has_age], kind='stable')
+        self.sorted_ages = ages[has_age][order]
+        self.age_user_ids = self.user_ids[has_age][order]
+
+    @classmethod
+    def from_frames(cls, users_df, trips_df):
+        city_codes, city_names = pd.factorize(users_df['city_of_residence'])
+        recent_codes, recent_names = pd.factorize(users_df['recently_visited_place'].map(normalize_place))
+        place_codes, place_names = pd.factorize(trips_df['place_of_visit'].map(normalize_place))
+        end_dates = pd.to_datetime(trips_df['end_date'], errors='coerce')
+        has_end_date = end_dates.notna().to_numpy()
+        end_days = np.zeros(len(trips_df), dtype=np.int64)
+        end_days[has_end_date] = end_dates[has_end_date].to_numpy().astype('datetime64[D]').astype(np.int64)
+        return cls(
+            users_df['user_id'].to_numpy(), users_df['age'].to_numpy(dtype=float),
+            city_codes, list(city_names), recent_codes, list(recent_names),
+            trips_df['user_id'].to_numpy(), place_codes.astype(np.int32), list(place_names),
+            end_days, has_end_date,
+        )
+
+    @classmethod
+    def from_columnar(cls, data):
+        users, trips = data.users, data.trips
+        return cls(
+            users['user_id'], users['age'],
+            users['city'], data.cities, users['recent_place'], data.places,
+            trips['user_id'], trips['place'], data.places,
+            trips['end_day'], trips['end_day'] != data.missing_day,
+        )
+
+    def rows_of(self, user_ids):
+        """First user row of each id, -1 for unknown ids."""
+        if len(self.id_keys) == 0:
+            rows = np.full(len(user_ids), -1, dtype=np.int64)
+        else:
+            idx = np.minimum(np.searchsorted(self.id_keys, user_ids), len(self.id_keys) - 1)
+            rows = np.where(self.id_keys[idx] == user_ids, self.id_rows[idx], -1)
+        if self.extra_ids:
+            for i in np.flatnonzero(rows < 0).tolist():
+                rows[i] = self.extra_ids.get(int(user_ids[i]), -1)
+        return rows
+
+    def row(self, user_id):
+        """First user row of an id, or None."""
+        if not isinstance(user_id, (int, np.integer)) or not -2**63 <= user_id < 2**63:
+            return None
+        idx = np.searchsorted(self.id_keys, user_id)
+        if idx == len(self.id_keys) or self.id_keys[idx] != user_id:
+            return self.extra_ids.get(user_id)
+        return int(self.id_rows[idx])
+
+    def all_user_ids(self):
+        """Distinct user ids in file order (ingested users last)."""
+        return self.user_ids[np.sort(self.id_rows)].tolist() + list(self.extra_ids)
+
+    def user_ids_after(self, after, count):
+        """Up to `count` distinct user ids greater than `after` (None: from the smallest), ascending."""
+        start = 0 if after is None else int(np.searchsorted(self.id_keys, after, side='right'))
+        ids = self.id_keys[start:start + count].tolist()
+        if self.extra_ids:
+            extra = [user_id for user_id in self.extra_ids if after is None or user_id > after]
+            ids = sorted(ids + extra)[:count]
+        return ids
+
+    def user(self, user_id):
+        pos = self.row(user_id)
+        if pos is None:
+            return None
+        city = self.user_cities[pos]
+        return UserRecord(
+            user_id,
+            self.ages[pos],
+            self.city_names[city] if city >= 0 else None,
+            self.recent_names[self.user_recent[pos]],
+        )
+
+    def users_in_age_range(self, age_low, age_high):
+        lo = np.searchsorted(self.sorted_ages, age_low, side='left')
+        hi = np.searchsorted(self.sorted_ages, age_high, side='right')
+        ids = self.age_user_ids[lo:hi].tolist()
+        for row in self.extra_age_rows:
+            if age_low <= self.ages[row] <= age_high:
+                ids.append(int(self.user_ids[row]))
+        return ids
+
+    def _group_user_ids(self, code, rows, offsets, extra_rows):
+        ids = []
+        if code + 1 < len(offsets):
+            ids = self.user_ids[rows[offsets[code]:offsets[code + 1]]].tolist()
+        if code in extra_rows:
+            ids.extend(self.user_ids[extra_rows[code]].tolist())
+        return ids
+
+    def users_in_city(self, city):
+        code = self.city_code.get(city)
+        if code is None:
+            return []
+        return self._group_user_ids(code, self.city_rows, self.city_offsets, self.extra_city_rows)
+
+    def users_with_recent_place(self, place_norm):
+        code = self.recent_code.get(place_norm)
+        if code is None:
+            return []
+        return self._group_user_ids(code, self.recent_rows, self.recent_offsets, self.extra_recent_rows)
+
+    def visited_places(self, user_id):
+        pos = self.row(user_id)
+        if pos is None:
+            return frozenset()
+        codes = self.place_codes[self.extra_trips.get(pos, [])]
+        if pos + 1 < len(self.visited_offsets):
+            codes = np.concatenate([self.visited_codes[self.visited_offsets[pos]:self.visited_offsets[pos + 1]], codes])
+        return frozenset(self.place_names[codes].tolist())
+
+    def user_trip_positions(self, user_id):
+        """Row positions of one user's trips in trips order, or None for unknown users."""
+        pos = self.row(user_id)
+        if pos is None:
+            return None
+        positions = np.empty(0, dtype=np.int64)
+        if pos + 1 < len(self.trip_offsets):
+            positions = self.trip_order[self.trip_offsets[pos]:self.trip_offsets[pos + 1]]
+        if pos in self.extra_trips:
+            positions = np.concatenate([positions, self.extra_trips[pos]])
+        return positions
+
+    def trip_positions(self, user_ids):
+        """Row positions of the users' trips, in trips order."""
+        rows = self.rows_of(np.asarray(user_ids, dtype=np.int64))
+        rows = rows[rows >= 0]
+        extra = [self.extra_trips[r] for r in rows.tolist() if r in self.extra_trips] if self.extra_trips else []
+        rows = rows[rows < len(self.trip_offsets) - 1]
+        starts, ends = self.trip_offsets[rows], self.trip_offsets[rows + 1]
+        lengths = ends - starts
+        total = int(lengths.sum())
+        # Concatenates trip_order[start:end] for every row without a Python loop
+        shift = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        positions = self.trip_order[np.arange(total) + shift]
+        if extra:
+            positions = np.concatenate([positions] + [np.asarray(p, dtype=np.int64) for p in extra])
+        return np.sort(positions)
+
+    def place_codes_for(self, places):
+        """Codes of the given normalized places; unknown places are skipped."""
+        return [self.code_of_place[p] for p in places if p in self.code_of_place]
+
+    def _append(self, name, values):
+        """Appends to a column in amortized O(len(values)); the column stays a view of a larger buffer."""
+        current = getattr(self, name)
+        n, k = len(current), len(values)
+        buffer = self._buffers.get(name)
+        if buffer is None or n + k > len(buffer):
+            buffer = np.empty(max(2 * (n + k), 16), dtype=current.dtype)
+            buffer[:n] = current
+            self._buffers[name] = buffer
+        buffer[n:n + k] = values
+        setattr(self, name, buffer[:n + k])
+
+    def _code(self, names, codes, name):
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(names)
+            names.append(name)
+        return code
+
+    def add_users(self, users):
+        """
+        Appends users given as (user_id, age, city or None, normalized recent place, ...);
+        ids must be new and further fields are ignored. Returns their rows.
+        """
+        first_row = len(self.user_ids)
+        self._append('user_ids', [u[0] for u in users])
+        self._append('ages', [np.nan if u[1] is None else float(u[1]) for u in users])
+        self._append('user_cities', [
+            -1 if u[2] is None else self._code(self.city_names, self.city_code, u[2]) for u in users
+        ])
+        self._append('user_recent', [self._code(self.recent_names, self.recent_code, u[3]) for u in users])
+        rows = list(range(first_row, first_row + len(users)))
+        for row, user in zip(rows, users):
+            self.extra_ids[user[0]] = row
+            if self.user_cities[row] >= 0:
+                self.extra_city_rows[int(self.user_cities[row])].append(row)
+            self.extra_recent_rows[int(self.user_recent[row])].append(row)
+            if not np.isnan(self.ages[row]):
+                self.extra_age_rows.append(row)
+        return rows
+
+    def add_trips(self, trips):
+        """
+        Appends trips given as (user_id, normalized place, end day or None, ...) of known
+        users; further fields are ignored. Returns their row positions.
+        """
+        first_pos = len(self.place_codes)
+        codes = []
+        for trip in trips:
+            place = trip[1]
+            if place not in self.code_of_place:
+                self.code_of_place[place] = len(self.place_names)
+                self._append('place_names', np.array([place], dtype=object))
+            codes.append(self.code_of_place[place])
+        rows = [self.row(trip[0]) for trip in trips]
+        self._append('place_codes', codes)
+        self._append('end_days', [0 if trip[2] is None else trip[2] for trip in trips])
+        self._append('has_end_date', [trip[2] is not None for trip in trips])
+        self._append('trip_user_rows', rows)
+        positions = list(range(first_pos, first_pos + len(trips)))
+        for pos, row in zip(positions, rows):
+            self.extra_trips.setdefault(row, []).append(pos)
+        return positions
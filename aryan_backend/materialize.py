@@ -0,0 +1,169 @@
+"""
+Offline materialization of recommendations for every user.
+
+Computes the three recommendation sections for all users of the CSV data
+(app_backend.py) or the Mongo collections (api/index.py) on a process pool,
+and writes them as a memory-mappable store:
+- user_ids.npy: sorted user ids (int64 for the CSVs, 24-byte ObjectId strings for Mongo)
+- recommendations.npy: int32 place codes, shape (users, 3, top_n), padded with -1
+- meta.json: place dictionary, section names, top_n, source and data version
+
+Usage (from aryan_backend/):
+    python materialize.py --source csv --out data/precomputed
+    python materialize.py --source mongo --out data/precomputed_mongo --workers 8
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+USER_IDS_FILE = "user_ids.npy"
+RECOMMENDATIONS_FILE = "recommendations.npy"
+META_FILE = "meta.json"
+
+
+class PrecomputedStore:
+    """Read-only view of a materialized store; arrays are memory-mapped, not copied."""
+
+    def __init__(self, path):
+        with open(os.path.join(path, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.place_names = self.meta["places"]
+        self.sections = self.meta["sections"]
+        self.user_ids = np.load(os.path.join(path, USER_IDS_FILE), mmap_mode="r")
+        self.codes = np.load(os.path.join(path, RECOMMENDATIONS_FILE), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def lookup(self, user_id):
+        """Returns {section: [places]} for a user, or None if the user was not materialized."""
+        key = user_id.encode() if self.user_ids.dtype.kind == "S" else user_id
+        row = np.searchsorted(self.user_ids, key)
+        if row >= len(self.user_ids) or self.user_ids[row] != key:
+            return None
+        return {
+            section: [self.place_names[c] for c in self.codes[row, i] if c >= 0]
+            for i, section in enumerate(self.sections)
+        }
+
+
+def write_store(path, user_ids, rows, sections, top_n, meta):
+    """Encodes rows of per-section place lists against a shared dictionary and writes the store."""
+    os.makedirs(path, exist_ok=True)
+    places = {}
+    codes = np.full((len(rows), len(sections), top_n), -1, dtype=np.int32)
+    for r, row in enumerate(rows):
+        for s, section_places in enumerate(row):
+            for k, place in enumerate(section_places[:top_n]):
+                codes[r, s, k] = places.setdefault(place, len(places))
+
+    if all(isinstance(uid, str) for uid in user_ids):
+        ids = np.array([uid.encode() for uid in user_ids], dtype="S24")
+    else:
+        ids = np.asarray(user_ids, dtype=np.int64)
+    order = np.argsort(ids, kind="stable")
+    np.save(os.path.join(path, USER_IDS_FILE), ids[order])
+    np.save(os.path.join(path, RECOMMENDATIONS_FILE), codes[order])
+    meta = dict(meta, places=list(places), sections=sections, top_n=top_n, users=len(rows))
+    with open(os.path.join(path, META_FILE), "w") as f:
+        json.dump(meta, f)
+
+
+# --- CSV source ---
+CSV_SECTIONS = ["similar_age_group", "co_visitation", "same_city"]
+CSV_TOP_N = 5
+
+
+def _csv_worker(user_ids):
+    import app_backend
+    rows = []
+    for user_id, result in app_backend.build_recommendations_batch(user_ids, top_n=CSV_TOP_N):
+        recs = result["user"]["recommendations"]
+        rows.append((user_id, [recs[section] for section in CSV_SECTIONS]))
+    return rows
+
+
+def materialize_csv(out, workers, chunk_size):
+    import app_backend
+    user_ids = app_backend.snapshot.index.all_user_ids()
+    chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+    results = _run_pool(_csv_worker, chunks, workers)
+    write_store(
+        out, [uid for uid, _ in results], [row for _, row in results], CSV_SECTIONS, CSV_TOP_N,
+        {"source": "csv", "data_version": app_backend.snapshot.data_version, "built_at": time.time()},
+    )
+    return len(results)
+
+
+# --- Mongo source ---
+MONGO_SECTIONS = ["based_on_similar_age_group", "based_on_co_visitation", "based_on_same_city"]
+MONGO_TOP_N = 7
+
+
+def _mongo_worker(user_docs):
+    import index
+    snapshot = _mongo_worker.snapshot
+    rows = []
+    group_cache = {}
+    for user in user_docs:
+        recs = index.compute_recommendations(user, snapshot, top_n=MONGO_TOP_N, group_cache=group_cache)
+        recs = recs["user"]["recommendations"]
+        rows.append((user["_id"], [recs[section] for section in MONGO_SECTIONS]))
+    return rows
+
+
+def materialize_mongo(out, workers, chunk_size):
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "api"))
+    import index
+    snapshot = index.load_snapshot()
+    # Workers inherit the snapshot through fork; each user row already carries age, city and places
+    _mongo_worker.snapshot = snapshot
+    users_df = snapshot.users_df
+    if "age" in users_df.columns:
+        users_df = users_df.sort_values("age")
+    # Drop NaN cells so rows look like the documents find_one returns
+    users = [
+        {k: v for k, v in record.items() if not (isinstance(v, float) and np.isnan(v))}
+        for record in users_df.to_dict("records")
+    ]
+    chunks = [users[i:i + chunk_size] for i in range(0, len(users), chunk_size)]
+    results = _run_pool(_mongo_worker, chunks, workers, start_method="fork")
+    write_store(
+        out, [uid for uid, _ in results], [row for _, row in results], MONGO_SECTIONS, MONGO_TOP_N,
+        {"source": "mongo", "data_version": snapshot.data_version, "built_at": time.time()},
+    )
+    return len(results)
+
+
+def _run_pool(worker, chunks, workers, start_method=None):
+    context = multiprocessing.get_context(start_method)
+    results = []
+    with context.Pool(processes=workers) as pool:
+        for rows in pool.imap_unordered(worker, chunks):
+            results.extend(rows)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute recommendations for every user.")
+    parser.add_argument("--source", choices=["csv", "mongo"], default="csv")
+    parser.add_argument("--out", default="data/precomputed")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    started = time.time()
+    if args.source == "csv":
+        count = materialize_csv(args.out, args.workers, args.chunk_size)
+    else:
+        count = materialize_mongo(args.out, args.workers, args.chunk_size)
+    print(f"Materialized {count} users to {args.out} in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
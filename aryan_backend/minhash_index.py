@@ -0,0 +1,204 @@
+import hashlib
+
+import numpy as np
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+# (place, permutation) pairs hashed per step when building signatures in bulk
+BUILD_CHUNK_PAIRS = 16384
+
+
+def place_hash(place):
+    """Stable 32-bit hash of a normalized place (Python's hash() differs between processes)."""
+    return int.from_bytes(hashlib.blake2b(place.encode(), digest_size=4).digest(), "little")
+
+
+class MinHashIndex:
+    """
+    MinHash signatures of users' place sets with an LSH banding index, to find the
+    users most Jaccard-similar to a set of places without touching every user.
+    - num_perm hash functions per signature; the fraction of equal entries of two
+      signatures estimates their Jaccard similarity with standard error ~ 1/sqrt(num_perm)
+    - signatures are cut into `bands` bands of num_perm / bands rows; users sharing any
+      band are candidates, so a pair with similarity s is found with probability
+      1 - (1 - s^rows)^bands (more bands: higher recall of less similar users, more candidates)
+    - exact=True keeps the place sets and ranks candidates by exact Jaccard instead of the estimate
+
+    Signatures and band keys are flat arrays indexed by user position; each band's
+    keys are sorted for lookup. update_user rewrites a user's row and appends its new
+    band keys to a small per-band overlay: entries whose key no longer matches the
+    user's row are skipped at query time, and the sorted arrays are rebuilt once the
+    overlay grows past a quarter of the users.
+    """
+
+    def __init__(self, num_perm=128, bands=32, exact=False, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm, self.bands, self.rows = num_perm, bands, num_perm // bands
+        self.exact = exact
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._band_mix = rng.randint(1, np.iinfo(np.int64).max, size=self.rows, dtype=np.uint64) | np.uint64(1)
+        self._hash_of = {}
+
+        self.user_ids = []
+        self.user_pos = {}
+        self.place_sets = []
+        self.size = 0
+        self.signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self.band_keys = np.empty((0, bands), dtype=np.uint64)
+        self.indexed = np.empty(0, dtype=bool)
+        self._sorted_keys = [np.empty(0, dtype=np.uint64)] * bands
+        self._sorted_pos = [np.empty(0, dtype=np.int64)] * bands
+        self._overlay = [{} for _ in range(bands)]
+        self._overlay_size = 0
+
+    @classmethod
+    def build(cls, user_places, **options):
+        """Index of {user_id: places}; signatures are computed in vectorized chunks."""
+        index = cls(**options)
+        user_ids = list(user_places)
+        place_sets = [frozenset(user_places[user_id]) for user_id in user_ids]
+        index._reserve(len(user_ids))
+        for user_id in user_ids:
+            index._position(user_id)
+        if index.exact:
+            index.place_sets = place_sets
+        n = len(user_ids)
+        index.signatures[:n] = index.signatures_of(place_sets)
+        index.band_keys[:n] = index._band_keys_of(index.signatures[:n])
+        index.indexed[:n] = [bool(places) for places in place_sets]
+        index._rebuild_bands()
+        return index
+
+    def _hashes(self, places):
+        hashes = []
+        for place in places:
+            h = self._hash_of.get(place)
+            if h is None:
+                h = self._hash_of[place] = place_hash(place)
+            hashes.append(h)
+        return np.asarray(hashes, dtype=np.uint64)
+
+    def signatures_of(self, place_sets):
+        """MinHash signatures (len(place_sets) x num_perm uint32); empty sets get all-MAX_HASH rows."""
+        sigs = np.full((len(place_sets), self.num_perm), MAX_HASH, dtype=np.uint32)
+        lengths = np.fromiter((len(places) for places in place_sets), dtype=np.int64, count=len(place_sets))
+        hashes = self._hashes(place for places in place_sets for place in places)
+        owners = np.repeat(np.arange(len(place_sets)), lengths)
+        step = max(BUILD_CHUNK_PAIRS // self.num_perm, 1)
+        for start in range(0, len(hashes), step):
+            chunk, chunk_owners = hashes[start:start + step], owners[start:start + step]
+            # Universal hashing (a * h + b) mod p, truncated to 32 bits; uint64 products wrap
+            values = ((self._a * chunk[:, None] + self._b) % MERSENNE_PRIME) & MAX_HASH
+            np.minimum.at(sigs, chunk_owners, values.astype(np.uint32))
+        return sigs
+
+    def _band_keys_of(self, sigs):
+        """One 64-bit key per band: a multilinear hash of the band's rows."""
+        banded = sigs.reshape(len(sigs), self.bands, self.rows).astype(np.uint64)
+        return (banded * self._band_mix).sum(axis=2, dtype=np.uint64)
+
+    def _reserve(self, n):
+        """Grows the per-user arrays to hold n users, doubling so appends are amortized O(1)."""
+        if n <= len(self.indexed):
+            return
+        capacity = max(2 * len(self.indexed), n, 16)
+        for name, shape_tail, fill in (
+            ("signatures", (self.num_perm,), MAX_HASH), ("band_keys", (self.bands,), 0), ("indexed", (), False)
+        ):
+            current = getattr(self, name)
+            grown = np.full((capacity,) + shape_tail, fill, dtype=current.dtype)
+            grown[:len(current)] = current
+            setattr(self, name, grown)
+
+    def _position(self, user_id):
+        pos = self.user_pos.get(user_id)
+        if pos is None:
+            pos = self.size
+            self._reserve(pos + 1)
+            self.user_ids.append(user_id)
+            self.user_pos[user_id] = pos
+            if self.exact:
+                self.place_sets.append(frozenset())
+            self.size += 1
+        return pos
+
+    def _rebuild_bands(self):
+        positions = np.flatnonzero(self.indexed[:self.size])
+        keys = self.band_keys[positions]
+        sorted_keys, sorted_pos = [], []
+        for band in range(self.bands):
+            order = np.argsort(keys[:, band], kind="stable")
+            sorted_keys.append(keys[order, band])
+            sorted_pos.append(positions[order])
+        self._sorted_keys, self._sorted_pos = sorted_keys, sorted_pos
+        self._overlay = [{} for _ in range(self.bands)]
+        self._overlay_size = 0
+
+    def update_user(self, user_id, places):
+        """Re-signs one user; cost is O(places * num_perm + bands)."""
+        places = frozenset(places)
+        pos = self._position(user_id)
+        sig = self.signatures_of([places])
+        keys = self._band_keys_of(sig)[0]
+        if self.exact:
+            self.place_sets[pos] = places
+        self.signatures[pos] = sig[0]
+        self.band_keys[pos] = keys
+        self.indexed[pos] = bool(places)
+        if places:
+            for band, key in enumerate(keys.tolist()):
+                self._overlay[band].setdefault(key, []).append(pos)
+            self._overlay_size += self.bands
+            if self._overlay_size > max(self.size * self.bands // 4, 1024):
+                self._rebuild_bands()
+
+    def remove_user(self, user_id):
+        pos = self.user_pos.get(user_id)
+        if pos is not None:
+            self.indexed[pos] = False
+
+    def similar(self, places, k, exclude_user_id=None, min_similarity=0.0, max_bucket=None):
+        """
+        Up to k (user_id, similarity) pairs for the users most similar to `places`,
+        most similar first. max_bucket caps the candidates taken from one band bucket,
+        bounding the cost for places shared by huge numbers of identical users.
+        """
+        places = frozenset(places)
+        if not places or k <= 0:
+            return []
+        sig = self.signatures_of([places])[0]
+        keys = self._band_keys_of(sig[None, :])[0]
+        found = []
+        for band, key in enumerate(keys.tolist()):
+            sorted_keys = self._sorted_keys[band]
+            lo = np.searchsorted(sorted_keys, key, side="left")
+            hi = np.searchsorted(sorted_keys, key, side="right")
+            if max_bucket is not None:
+                hi = min(hi, lo + max_bucket)
+            found.append(self._sorted_pos[band][lo:hi])
+            extra = self._overlay[band].get(key)
+            if extra:
+                found.append(np.asarray(extra, dtype=np.int64))
+        candidates = np.unique(np.concatenate(found))
+        # Entries left behind by updates no longer share the band key with the user's row
+        candidates = candidates[self.indexed[candidates] & (self.band_keys[candidates] == keys).any(axis=1)]
+        if exclude_user_id in self.user_pos:
+            candidates = candidates[candidates != self.user_pos[exclude_user_id]]
+        if len(candidates) == 0:
+            return []
+
+        if self.exact:
+            scores = np.asarray([
+                len(places & self.place_sets[pos]) / len(places | self.place_sets[pos])
+                for pos in candidates.tolist()
+            ])
+        else:
+            scores = (self.signatures[candidates] == sig).mean(axis=1)
+        keep = scores >= min_similarity
+        candidates, scores = candidates[keep], scores[keep]
+        # Most similar first, ties in insertion order
+        order = np.lexsort((candidates, -scores))[:k]
+        return [(self.user_ids[pos], float(scores[i])) for i, pos in zip(order.tolist(), candidates[order].tolist())]
@@ -0,0 +1,137 @@
+import numpy as np
+
+PERCENTILES = (25, 50, 75, 90)
+
+
+def _csr_sorted(codes, values, n_places):
+    """Known (non-NaN) values sorted within each place code, plus per-code offsets."""
+    known = ~np.isnan(values)
+    codes, values = codes[known], values[known]
+    order = np.lexsort((values, codes))
+    offsets = np.zeros(n_places + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes, minlength=n_places), out=offsets[1:])
+    return values[order], offsets
+
+
+def _grouped_percentiles(values, offsets):
+    """PERCENTILES of each code's sorted values (NaN rows for codes without any), interpolated like np.percentile."""
+    counts = np.diff(offsets)
+    out = np.full((len(counts), len(PERCENTILES)), np.nan)
+    has = counts > 0
+    starts, counts = offsets[:-1][has], counts[has]
+    for j, q in enumerate(PERCENTILES):
+        pos = (counts - 1) * (q / 100)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.ceil(pos).astype(np.int64)
+        low, high = values[starts + lo], values[starts + hi]
+        out[has, j] = low + (high - low) * (pos - lo)
+    return out
+
+
+class PlaceStats:
+    """
+    Per-place trip statistics, computed once at load with vectorized parsing:
+    trip count, budget and duration percentiles (over the trips where they are
+    known) and the latest visit. Rows are indexed by the lookup index's place codes,
+    so a request filter is one comparison over places (allowed) instead of a pass
+    over the trips.
+
+    Known values are kept sorted per place (flat array plus offsets); add_trips
+    appends to small per-place overlays and recomputes only the places it touches.
+    Callers serialize it against readers (see ingest.Snapshot).
+    """
+
+    def __init__(self, place_codes, durations, budgets, end_days, has_end_date, n_places):
+        place_codes = np.asarray(place_codes, dtype=np.int64)
+        self.trips = np.bincount(place_codes, minlength=n_places).astype(np.int64)
+        self.last_day = np.full(n_places, np.iinfo(np.int64).min, dtype=np.int64)
+        dated = np.asarray(has_end_date, dtype=bool)
+        np.maximum.at(self.last_day, place_codes[dated], np.asarray(end_days, dtype=np.int64)[dated])
+        self._values = {}
+        self._offsets = {}
+        self._extra = {}
+        for name, values in (("budget", budgets), ("duration", durations)):
+            self._values[name], self._offsets[name] = _csr_sorted(
+                place_codes, np.asarray(values, dtype=float), n_places
+            )
+            self._extra[name] = {}
+        self.budget = _grouped_percentiles(self._values["budget"], self._offsets["budget"])
+        self.duration = _grouped_percentiles(self._values["duration"], self._offsets["duration"])
+
+    @property
+    def n_places(self):
+        return len(self.trips)
+
+    def _resize(self, n_places):
+        grow = n_places - self.n_places
+        if grow <= 0:
+            return
+        self.trips = np.concatenate([self.trips, np.zeros(grow, dtype=np.int64)])
+        self.last_day = np.concatenate([self.last_day, np.full(grow, np.iinfo(np.int64).min, dtype=np.int64)])
+        self.budget = np.vstack([self.budget, np.full((grow, len(PERCENTILES)), np.nan)])
+        self.duration = np.vstack([self.duration, np.full((grow, len(PERCENTILES)), np.nan)])
+
+    def _place_values(self, name, code):
+        offsets = self._offsets[name]
+        base = self._values[name][offsets[code]:offsets[code + 1]] if code + 1 < len(offsets) else []
+        return np.concatenate([base, self._extra[name].get(code, [])])
+
+    def add_trips(self, place_codes, durations, budgets, end_days, has_end_date, n_places):
+        """Adds trips (None or NaN for unknown duration/budget); cost is proportional to the places touched."""
+        self._resize(n_places)
+        touched = {"budget": set(), "duration": set()}
+        for code, duration, budget, day, dated in zip(place_codes, durations, budgets, end_days, has_end_date):
+            self.trips[code] += 1
+            if dated:
+                self.last_day[code] = max(self.last_day[code], day)
+            for name, value in (("budget", budget), ("duration", duration)):
+                if value is not None and not np.isnan(value):
+                    self._extra[name].setdefault(code, []).append(float(value))
+                    touched[name].add(code)
+        for name, table in (("budget", self.budget), ("duration", self.duration)):
+            for code in touched[name]:
+                table[code] = np.percentile(self._place_values(name, code), PERCENTILES)
+
+    def allowed(self, max_budget=None, max_days=None, n_places=0):
+        """
+        Mask over place codes (at least n_places long): median budget <= max_budget and
+        median duration <= max_days. A place without known values, or without trips,
+        fails a filter on them. None when there is no filter.
+        """
+        if max_budget is None and max_days is None:
+            return None
+        mask = np.zeros(max(n_places, self.n_places), dtype=bool)
+        mask[:self.n_places] = True
+        median = PERCENTILES.index(50)
+        # NaN compares False, so unknown medians fail
+        if max_budget is not None:
+            mask[:self.n_places] &= self.budget[:, median] <= max_budget
+        if max_days is not None:
+            mask[:self.n_places] &= self.duration[:, median] <= max_days
+        return mask
+
+    def records(self, place_names, codes=None):
+        """JSON-ready rows for the given place codes (default all), most visited first."""
+        if codes is None:
+            codes = np.flatnonzero(self.trips > 0)
+        codes = np.asarray(codes, dtype=np.int64)
+        codes = codes[np.lexsort((np.asarray(place_names, dtype=object)[codes].astype(str), -self.trips[codes]))]
+        dated = self.last_day > np.iinfo(np.int64).min
+        latest = self.last_day[dated].max() if dated.any() else None
+
+        def percentiles(row):
+            return {f"p{q}": None if np.isnan(v) else round(float(v), 2) for q, v in zip(PERCENTILES, row)}
+
+        rows = []
+        for code in codes.tolist():
+            has_day = bool(dated[code])
+            rows.append({
+                "place": str(place_names[code]),
+                "trips": int(self.trips[code]),
+                "budget": percentiles(self.budget[code]),
+                "duration_days": percentiles(self.duration[code]),
+                "last_visit": str(np.datetime64(int(self.last_day[code]), 'D')) if has_day else None,
+                # Relative to the latest trip in the data, so the table does not age with the clock
+                "days_since_last_visit": int(latest - self.last_day[code]) if has_day else None,
+            })
+        return rows
@@ -0,0 +1,62 @@
+import numpy as np
+
+
+def recency_weights(days, valid):
+    """Recency in [0, 1] relative to the group's own date range; 0 for missing dates."""
+    recency = np.zeros(len(days), dtype=float)
+    if valid.any():
+        min_day = days[valid].min()
+        max_day = days[valid].max()
+        recency[valid] = (days[valid] - min_day) / max(max_day - min_day, 1)
+    return recency
+
+
+def top_places(scores, first_seen, candidates, top_n):
+    """
+    Picks the top_n candidate codes by score, ties broken by first appearance.
+    Only the candidates at or above the top_n-th score are fully sorted.
+    """
+    cand_scores = scores[candidates]
+    if len(candidates) > top_n:
+        kth = np.partition(cand_scores, len(candidates) - top_n)[len(candidates) - top_n]
+        keep = cand_scores >= kth
+        candidates, cand_scores = candidates[keep], cand_scores[keep]
+    order = np.lexsort((first_seen[candidates], -cand_scores))
+    return candidates[order[:top_n]]
+
+
+class GroupAggregate:
+    """Per-place scores for one peer group: sum(1 + recency) over the group's trips."""
+
+    def __init__(self, index, positions):
+        self.n_places = len(index.place_names)
+        codes = index.place_codes[positions]
+        days = index.end_days[positions]
+        valid = index.has_end_date[positions]
+        weights = 1.0 + recency_weights(days, valid)
+        self.scores = np.bincount(codes, weights=weights, minlength=self.n_places)
+        self.present, first_idx = np.unique(codes, return_index=True)
+        self.first_seen = np.zeros(self.n_places, dtype=np.int64)
+        self.first_seen[self.present] = first_idx
+
+    def rank(self, index, exclude_places, top_n, allowed=None):
+        excluded = np.zeros(self.n_places, dtype=bool)
+        excluded[index.place_codes_for(exclude_places)] = True
+        if allowed is not None:
+            excluded |= ~allowed[:self.n_places]
+        candidates = self.present[~excluded[self.present]]
+        if len(candidates) == 0:
+            return []
+        return index.place_names[top_places(self.scores, self.first_seen, candidates, top_n)].tolist()
+
+
+def rank_group_places(index, positions, exclude_places, top_n, allowed=None):
+    """
+    Scores the trips at `positions` as sum(1 + recency) per place and
+    returns the top_n place names not in `exclude_places` (and allowed, a mask
+    over place codes, when given).
+    """
+    if len(positions) == 0:
+        return []
+    return GroupAggregate(index, positions).rank(index, exclude_places, top_n, allowed)
+
@@ -0,0 +1,127 @@
+"""
+Pre-fork production launcher for app_backend.py.
+
+The master imports app_backend once: the data is parsed (or memory-mapped with
+COLUMNAR_DIR) and the lookup index and histograms are built as flat NumPy arrays.
+It then freezes the garbage collector's view of those objects, binds the listening
+socket and forks the workers, which inherit the data as shared copy-on-write pages
+and accept connections from the same socket. The index holds no per-user Python
+objects, so serving does not write to the inherited pages and memory stays near
+one copy of the data however many workers run. Workers that die are replaced.
+
+Result caches and /metrics are per worker. Rows one worker ingests (POST /users,
+/trips) are appended to the CSVs. Before each request a worker stats the CSVs and adds
+rows the others appended to its own snapshot (app_backend.catch_up), so the ingesting
+client's next request finds them on any worker, and an ingest costs each worker time
+proportional to the rows rather than a reload. Pages the added rows touch become private
+to each worker; a restart shares everything again. kill -HUP on the master is forwarded
+to the workers, which each reload their snapshot in full.
+
+Each worker serves the inherited socket with waitress (requirements-serve.txt), a
+production WSGI server: connections are read and written by an event loop, so slow
+clients and idle keep-alive connections don't hold a request thread; --threads request
+threads run the app; idle connections close after --channel-timeout seconds and at most
+--connection-limit are open per worker. Werkzeug's development server is not used.
+
+Usage (from aryan_backend/):
+    pip install -r requirements-serve.txt
+    python serve.py --workers 8 --port 5001
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+from waitress.server import create_server
+
+RESPAWN_DELAY_SECONDS = 1.0
+
+
+def bind(host, port, backlog):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def spawn(app, sock, server_options, on_hangup):
+    pid = os.fork()
+    if pid:
+        return pid
+    # Worker: default signal handling, app_backend's reload on SIGHUP, serve until terminated
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGHUP, on_hangup)
+    server = create_server(app, sockets=[sock], **server_options)
+    try:
+        server.run()
+    finally:
+        os._exit(0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve app_backend with pre-forked workers.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--threads", type=int, default=4,
+                        help="request threads per worker; scoring holds the GIL, so more workers scale better, "
+                             "but a few threads keep a long request (an export) from stalling the worker")
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--channel-timeout", type=int, default=120,
+                        help="seconds before an idle (keep-alive) connection is closed")
+    parser.add_argument("--connection-limit", type=int, default=1000, help="open connections per worker")
+    args = parser.parse_args(argv)
+
+    started = time.time()
+    import app_backend
+    # Objects that exist now are never collected; freezing them keeps the collector
+    # from touching (and so copying) the pages workers inherit
+    gc.collect()
+    gc.freeze()
+    print(f"Loaded data in {time.time() - started:.1f}s, starting {args.workers} workers on port {args.port}")
+
+    on_hangup = signal.getsignal(signal.SIGHUP)
+    sock = bind(args.host, args.port, args.backlog)
+    server_options = {
+        "threads": args.threads, "channel_timeout": args.channel_timeout,
+        "connection_limit": args.connection_limit, "asyncore_use_poll": True,
+    }
+    workers = {spawn(app_backend.app, sock, server_options, on_hangup) for _ in range(args.workers)}
+    stopping = False
+
+    def signal_workers(signum, frame=None):
+        for pid in workers:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        signal_workers(signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGHUP, signal_workers)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        workers.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} exited with status {status}, restarting", file=sys.stderr)
+            time.sleep(RESPAWN_DELAY_SECONDS)
+            workers.add(spawn(app_backend.app, sock, server_options, on_hangup))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+"""
+Run from aryan_backend/:
+    pip install -r requirements-test.txt
+    python -m pytest tests
+The pipeline-mode tests also need a mongod: MONGO_TEST_URI, default mongodb://localhost:27017.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# As the apps and benchmarks run: from aryan_backend/, with api/ importable too
+sys.path[:0] = [ROOT, os.path.join(ROOT, "api")]
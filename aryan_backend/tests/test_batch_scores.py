@@ -0,0 +1,130 @@
+"""
+Batch recommendations score each peer group once (SharedGroupScores) and take each
+member out of the shared sums; every user must get exactly what a single request computes.
+"""
+import random
+from collections import ChainMap
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+import index
+from index import SharedGroupScores, group_place_scores
+
+PLACES = ["Goa", "Agra", "Dubai", "London", "Bali", "Leh"]
+# Few distinct days, so several users share the group's first or last trip date
+DAYS = [datetime(2024, 1, 1) + timedelta(days=30 * i) for i in range(4)]
+
+
+def assert_same_scores(shared, group_ids, trips_df, doc_cache, user_id):
+    others = [i for i in group_ids if i != user_id]
+    expected = group_place_scores(others, trips_df, doc_cache)
+    got = shared.without(user_id)
+    if got is None:
+        return False
+    # Same floats in the same (first-seen) order: ties are broken by that order downstream
+    assert list(got.items()) == list(expected.items())
+    return True
+
+
+def test_without_matches_scoring_the_rest_of_the_group():
+    doc_cache = {
+        "a": {"placesVisited": ["Goa", "Agra"], "recentlyVisited": ["Goa"]},
+        "b": {"placesVisited": ["goa ", "Dubai"], "recentlyVisited": []},
+        "c": {"placesVisited": ["Agra"], "recentlyVisited": ["Bali"]},
+        "d": {"placesVisited": [], "recentlyVisited": []},
+        "e": {"placesVisited": ["Bali", "Dubai"], "recentlyVisited": ["Leh"]},
+    }
+    trips_df = pd.DataFrame([
+        ("a", "Leh", DAYS[0]),      # a alone holds the first date
+        ("b", "Goa", DAYS[1]),
+        ("c", "Dubai", DAYS[3]),    # c and d share the last date
+        ("d", "Agra", DAYS[3]),
+        ("d", "Goa", None),
+        ("e", "", DAYS[2]),
+        ("e", "London", DAYS[1]),
+    ], columns=["user_id", "destination", "updatedAt"])
+    group_ids = list(doc_cache)
+    shared = SharedGroupScores(group_ids, trips_df, ChainMap({}, doc_cache))
+    assert list(shared.scores.items()) == list(group_place_scores(group_ids, trips_df, doc_cache).items())
+    scored = {user_id for user_id in group_ids if assert_same_scores(shared, group_ids, trips_df, doc_cache, user_id)}
+    # Only a user holding a date edge alone moves the others' recency, and is scored directly
+    assert scored == set(group_ids) - {"a"}
+    # A user outside the group changes nothing
+    assert shared.without("z") == shared.scores
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_without_matches_on_random_overlapping_groups(seed):
+    rnd = random.Random(seed)
+    users = [f"u{i}" for i in range(30)]
+    doc_cache = {
+        user_id: {"placesVisited": rnd.sample(PLACES, rnd.randint(0, 3)), "recentlyVisited": rnd.sample(PLACES, 1)}
+        for user_id in users
+    }
+    trips_df = pd.DataFrame([
+        (rnd.choice(users), rnd.choice(PLACES + [""]), rnd.choice(DAYS + [None]))
+        for _ in range(60)
+    ], columns=["user_id", "destination", "updatedAt"])
+    for _ in range(5):
+        group_ids = rnd.sample(users, rnd.randint(1, 12))
+        shared = SharedGroupScores(group_ids, trips_df, ChainMap({}, doc_cache))
+        for user_id in group_ids:
+            assert_same_scores(shared, group_ids, trips_df, doc_cache, user_id)
+
+
+@pytest.fixture
+def mock_mongo(monkeypatch):
+    """index on a seeded in-process mongomock database, with its own snapshot and result caches."""
+    mongomock = pytest.importorskip("mongomock")
+    import pymongo
+    from bson import ObjectId
+
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(pymongo, "MongoClient", lambda *args, **kwargs: client)
+    monkeypatch.setattr(index, "mongo", index.MongoConnection("mongodb://localhost", index.DB_NAME))
+    monkeypatch.setattr(index, "snapshot_cache", index.SnapshotCache(
+        index.load_snapshot, index.fetch_data_version, ttl_seconds=3600, poll_seconds=3600
+    ))
+    index.result_cache.clear()
+
+    rnd = random.Random(11)
+    users = []
+    for i in range(60):
+        user = {
+            "_id": ObjectId(), "city": rnd.choice(["Delhi", "Pune", "Mumbai"]),
+            "placesVisited": rnd.sample(PLACES, rnd.randint(0, 3)), "recentlyVisited": rnd.sample(PLACES, 1),
+        }
+        if i % 7:
+            # Ages close together: users sit in many overlapping age windows
+            user["age"] = rnd.randint(25, 36)
+        users.append(user)
+    trips = []
+    for _ in range(150):
+        trip = {"_id": ObjectId(), "user_id": rnd.choice(users)["_id"], "destination": rnd.choice(PLACES)}
+        if rnd.random() < 0.8:
+            trip["updatedAt"] = rnd.choice(DAYS)
+        trips.append(trip)
+    db = client[index.DB_NAME]
+    db[index.USERS_COLLECTION].insert_many(users)
+    db[index.TRIPS_COLLECTION].insert_many(trips)
+    yield [str(user["_id"]) for user in users]
+    index.result_cache.clear()
+
+
+def test_batch_matches_single_requests(mock_mongo):
+    ids = mock_mongo + ["0" * 24, "not-an-id"]
+    client = index.app.test_client()
+    single = {}
+    for user_id in ids:
+        response = client.get(f"/recommend_cities?id={user_id}")
+        single[user_id] = (response.status_code, response.get_json())
+    index.result_cache.clear()
+    response = client.post("/recommend_cities/batch", json={"ids": ids})
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [result.pop("id") for result in results] == ids
+    for user_id, result in zip(ids, results):
+        status, body = single[user_id]
+        assert result == (body if status == 200 else {"error": body["error"]}), user_id
@@ -0,0 +1,189 @@
+"""
+POST /users and /trips, and rows caught up from the files, against a fresh load of the
+same files: every response the snapshot serves must be the same either way.
+"""
+import csv
+import os
+import random
+
+import pytest
+
+USERS_HEADER = [
+    "user_id", "f_name", "l_name", "age", "email", "mobile", "city_of_residence", "country_of_residence",
+    "number_of_trips", "places_visited", "recently_visited_place", "username",
+]
+TRIPS_HEADER = ["booking_id", "user_id", "place_of_visit", "duration_of_visit", "start_date", "end_date", "overall_budget"]
+PLACES = ["Goa", "Agra", "Dubai", "London", "Bali", "Paris", "Manali", "Jaipur"]
+CITIES = ["Delhi", "Mumbai", "Pune"]
+
+
+def write_csv(path, header, rows, trailing_newline=True):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=header, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+    if not trailing_newline:
+        with open(path, "rb+") as f:
+            f.truncate(os.path.getsize(path) - 1)
+
+
+def data_rows(n_users=40, n_trips=120, seed=3):
+    rnd = random.Random(seed)
+    users = [{
+        "user_id": user_id, "f_name": f"user{user_id}", "age": rnd.randint(20, 40),
+        "city_of_residence": rnd.choice(CITIES), "country_of_residence": "India",
+        "places_visited": ", ".join(rnd.sample(PLACES, rnd.randint(1, 3))), "recently_visited_place": rnd.choice(PLACES),
+    } for user_id in range(1, n_users + 1)]
+    trips = []
+    for booking_id in range(1, n_trips + 1):
+        month, day = rnd.randint(1, 12), rnd.randint(1, 25)
+        trips.append({
+            "booking_id": booking_id, "user_id": rnd.randint(1, n_users), "place_of_visit": rnd.choice(PLACES),
+            "duration_of_visit": 3, "start_date": f"2024-{month:02d}-{day:02d}",
+            "end_date": f"2024-{month:02d}-{day + 3:02d}", "overall_budget": f"INR {rnd.randint(5, 90) * 1000}",
+        })
+    return users, trips
+
+
+@pytest.fixture(scope="session")
+def app_backend(tmp_path_factory):
+    """app_backend imported once, on files each test replaces through use_files."""
+    data_dir = tmp_path_factory.mktemp("import")
+    users, trips = data_rows()
+    write_csv(data_dir / "users.csv", USERS_HEADER, users)
+    write_csv(data_dir / "trips.csv", TRIPS_HEADER, trips)
+    os.environ.update(
+        USERS_FILE=str(data_dir / "users.csv"), TRIPS_FILE=str(data_dir / "trips.csv"), RELOAD_POLL_SECONDS="0"
+    )
+    import app_backend
+    return app_backend
+
+
+@pytest.fixture
+def use_files(app_backend, tmp_path, monkeypatch):
+    def use(users, trips, trailing_newline=True):
+        users_file, trips_file = str(tmp_path / "users.csv"), str(tmp_path / "trips.csv")
+        write_csv(users_file, USERS_HEADER, users, trailing_newline)
+        write_csv(trips_file, TRIPS_HEADER, trips, trailing_newline)
+        monkeypatch.setattr(app_backend, "USERS_FILE", users_file)
+        monkeypatch.setattr(app_backend, "TRIPS_FILE", trips_file)
+        app_backend.reload_snapshot(force=True)
+        return app_backend.app.test_client()
+    return use
+
+
+def served(app_backend, client):
+    """Every recommendation, trending report and place statistic the current snapshot serves."""
+    app_backend.result_cache.clear()
+    user_ids = app_backend.snapshot.index.user_ids.tolist()
+    responses = {}
+    for user_id in user_ids:
+        for query in ("", "&window=2", "&max_budget=40000"):
+            responses[f"/recommend_cities?user_id={user_id}{query}"] = None
+    for query in ("", "?city=delhi", "?age_band=20-29", "?city=pune&age_band=30-39"):
+        responses[f"/trending{query}"] = None
+    responses["/places/stats"] = None
+    for path in responses:
+        response = client.get(path)
+        responses[path] = (response.status_code, response.get_json())
+    batch = client.post("/recommend_cities/batch", json={"user_ids": user_ids})
+    responses["batch"] = (batch.status_code, batch.get_data(as_text=True))
+    return responses
+
+
+def assert_matches_fresh_load(app_backend, client):
+    ingested = served(app_backend, client)
+    app_backend.reload_snapshot(force=True)
+    assert served(app_backend, client) == ingested
+
+
+def post(client, path, payload):
+    response = client.post(path, json=payload)
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()
+
+
+def test_ingest_matches_fresh_load(app_backend, use_files):
+    client = use_files(*data_rows())
+    post(client, "/users", [
+        {"user_id": 41, "age": 25, "city_of_residence": "Delhi", "recently_visited_place": "Goa",
+         "places_visited": "Goa, Leh"},
+        {"user_id": 42, "recently_visited_place": "Leh"},
+        {"user_id": 43, "age": 33, "city_of_residence": "Chennai", "recently_visited_place": " bali "},
+    ])
+    post(client, "/trips", [
+        {"booking_id": 500, "user_id": 41, "place_of_visit": "Leh", "duration_of_visit": 4,
+         "start_date": "2024-12-20", "end_date": "2024-12-24", "overall_budget": "INR 47365"},
+        {"user_id": 42, "place_of_visit": "Kochi", "end_date": "2024-12-30", "overall_budget": 1234.6},
+        {"user_id": 43, "place_of_visit": "Chennai"},
+        {"user_id": 5, "place_of_visit": "Paris", "duration_of_visit": 2.5, "end_date": "2023-01-02"},
+    ])
+    assert_matches_fresh_load(app_backend, client)
+
+
+def test_trip_ids_follow_the_last_row(app_backend, use_files):
+    users, trips = data_rows()
+    client = use_files(users, trips)
+    post(client, "/trips", [{"user_id": 1, "place_of_visit": "Goa"}, {"user_id": 2, "place_of_visit": "Agra"}])
+    post(client, "/trips", {"user_id": 3, "place_of_visit": "Bali", "booking_id": 900})
+    post(client, "/trips", {"trips": [{"user_id": 4, "place_of_visit": "Leh"}]})
+    with open(app_backend.TRIPS_FILE, newline="") as f:
+        ids = [int(row["booking_id"]) for row in csv.DictReader(f)]
+    assert ids == list(range(1, len(trips) + 1)) + [len(trips) + 1, len(trips) + 2, 900, 901]
+
+
+def test_fractional_age_drops_age_histograms(app_backend, use_files):
+    client = use_files(*data_rows())
+    assert app_backend.snapshot.age_histograms is not None
+    post(client, "/users", {"user_id": 41, "age": 30.5, "city_of_residence": "Pune", "recently_visited_place": "Goa"})
+    # Users alone change no histogram; the first trip of a fractional age does
+    assert app_backend.snapshot.age_histograms is not None
+    post(client, "/trips", {"user_id": 41, "place_of_visit": "Manali", "end_date": "2024-06-01"})
+    assert app_backend.snapshot.age_histograms is None
+    assert_matches_fresh_load(app_backend, client)
+    assert app_backend.snapshot.age_histograms is None
+
+
+def test_files_without_trailing_newline(app_backend, use_files):
+    users, trips = data_rows()
+    client = use_files(users, trips, trailing_newline=False)
+    post(client, "/users", {"user_id": 41, "age": 22, "recently_visited_place": "Agra", "places_visited": "Agra"})
+    post(client, "/trips", {"user_id": 41, "place_of_visit": "Agra", "end_date": "2024-11-11"})
+    assert_matches_fresh_load(app_backend, client)
+    assert len(app_backend.snapshot.index.user_ids) == len(users) + 1
+
+
+def test_catch_up_with_rows_another_process_appended(app_backend, use_files, monkeypatch):
+    from ingest import append_csv_rows, locked_file
+
+    monkeypatch.setattr(app_backend, "RELOAD_POLL_SECONDS", 3600)
+    client = use_files(*data_rows())
+    snapshot = app_backend.snapshot
+    with locked_file(app_backend.USERS_FILE) as f:
+        append_csv_rows(f, [{"user_id": 41, "age": 27, "city_of_residence": "Mumbai",
+                             "recently_visited_place": "Dubai", "places_visited": "Dubai, Goa"}])
+    with locked_file(app_backend.TRIPS_FILE) as f:
+        append_csv_rows(f, [
+            {"user_id": 41, "place_of_visit": "Dubai", "end_date": "2024-12-01", "overall_budget": "INR 51000"},
+            {"user_id": 7, "place_of_visit": "Leh", "end_date": "2024-12-02", "duration_of_visit": 6},
+        ], id_field="booking_id")
+    # The next request catches up before it is served
+    assert client.get("/recommend_cities?user_id=41").status_code == 200
+    # Added in place rather than reloaded
+    assert app_backend.snapshot is snapshot
+    assert app_backend.loaded_source_version == app_backend.source_version()
+    assert_matches_fresh_load(app_backend, client)
+
+
+@pytest.mark.parametrize("payload, error", [
+    ({"user_id": 1, "recently_visited_place": "Goa"}, "already exists"),
+    ({"user_id": -1, "recently_visited_place": "Goa"}, "non-negative integer"),
+    ({"user_id": 41, "age": "30", "recently_visited_place": "Goa"}, "age must be a number"),
+    ({"user_id": 41}, "recently_visited_place is required"),
+])
+def test_invalid_users_change_nothing(app_backend, use_files, payload, error):
+    client = use_files(*data_rows())
+    version = app_backend.source_version()
+    response = client.post("/users", json=payload)
+    assert response.status_code == 400 and error in response.get_json()["error"]
+    assert app_backend.source_version() == version
@@ -0,0 +1,135 @@
+"""
+QUERY_MODE=pipeline against a real MongoDB: the aggregations must rank every peer group's
+places as the in-memory scorer does. mongomock has no $setWindowFields or collations, so
+these need a mongod at MONGO_TEST_URI (default mongodb://localhost:27017) and are skipped
+without one; they seed a throwaway database and drop it.
+"""
+import os
+import random
+import uuid
+from collections import ChainMap
+from datetime import datetime, timedelta
+
+import pytest
+
+import index
+
+MONGO_TEST_URI = os.environ.get("MONGO_TEST_URI", "mongodb://localhost:27017")
+# Mixed case, as users type them: pipeline matching relies on the case-insensitive collation
+PLACES = ["Goa", "goa", "Agra", "Dubai", "LONDON", "Bali", "Leh", "Paris", "Manali"]
+CITIES = ["Delhi", "delhi", "Pune", "Mumbai"]
+TOP_N = 7
+
+
+def seed(db, rnd):
+    from bson import ObjectId
+
+    users = []
+    for i in range(80):
+        user = {
+            "_id": ObjectId(), "city": rnd.choice(CITIES),
+            "placesVisited": rnd.sample(PLACES, rnd.randint(0, 4)), "recentlyVisited": rnd.sample(PLACES, 1),
+        }
+        if i % 9:
+            user["age"] = rnd.randint(22, 45)
+        users.append(user)
+    trips = []
+    for _ in range(300):
+        trip = {"_id": ObjectId(), "user_id": rnd.choice(users)["_id"], "destination": rnd.choice(PLACES + [""])}
+        if rnd.random() < 0.85:
+            trip["updatedAt"] = datetime(2023, 1, 1) + timedelta(days=rnd.randint(0, 700))
+        trips.append(trip)
+    db[index.USERS_COLLECTION].insert_many(users)
+    db[index.TRIPS_COLLECTION].insert_many(trips)
+
+
+@pytest.fixture(scope="module")
+def mongo_db():
+    import pymongo
+
+    client = pymongo.MongoClient(MONGO_TEST_URI, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+    except pymongo.errors.PyMongoError as e:
+        pytest.skip(f"No MongoDB at {MONGO_TEST_URI} ({type(e).__name__})")
+    name = f"recommender_test_{uuid.uuid4().hex[:8]}"
+    seed(client[name], random.Random(5))
+    yield name
+    client.drop_database(name)
+    client.close()
+
+
+@pytest.fixture
+def snapshot(mongo_db, monkeypatch):
+    """index on the test database, with fresh caches; returns the in-memory snapshot of it."""
+    monkeypatch.setattr(index, "mongo", index.MongoConnection(MONGO_TEST_URI, mongo_db))
+    monkeypatch.setattr(index, "snapshot_cache", index.SnapshotCache(
+        index.load_snapshot, index.fetch_data_version, ttl_seconds=3600, poll_seconds=3600
+    ))
+    monkeypatch.setattr(index, "trip_fields", index.TimedValue(index.detect_trip_fields, 3600))
+    monkeypatch.setattr(index, "pipeline_version", index.TimedValue(index.pipeline_data_version, 3600))
+    monkeypatch.setattr(index, "pipeline_rankings", index.TimedValue(index.load_rankings, 3600))
+    monkeypatch.setattr(index, "pipeline_indexes_checked", False)
+    monkeypatch.setattr(index, "PIPELINE_CREATE_INDEXES", True)
+    index.result_cache.clear()
+    yield index.snapshot_cache.get()
+    index.result_cache.clear()
+
+
+def peer_groups(snapshot, user):
+    """(pipeline match, in-memory group ids) of each strategy, built as the two modes build them."""
+    age, city = user.get("age"), index.normalize_place(user.get("city", ""))
+    visited = index.get_all_user_places(user)
+    groups = []
+    if age is not None:
+        groups.append(({"age": {"$gte": age - 5, "$lte": age + 5}}, index.age_group_ids(snapshot, age, 5)))
+    if visited:
+        places = sorted(visited)
+        groups.append((
+            {"$or": [{"placesVisited": {"$in": places}}, {"recentlyVisited": {"$in": places}}]},
+            snapshot.place_index.co_visitors(visited),
+        ))
+    if city:
+        groups.append(({"city": city}, index.city_group_ids(snapshot, city)))
+    return groups
+
+
+def test_pipeline_indexes_are_created_on_first_query(snapshot):
+    assert index.ensure_pipeline_indexes(create=False)
+    index.check_pipeline_indexes()
+    assert index.ensure_pipeline_indexes(create=False) == []
+
+
+def test_pipeline_groups_rank_like_the_snapshot(snapshot):
+    checked = 0
+    for user_id in snapshot.user_docs:
+        user = index.get_user_by_id(user_id)
+        visited = index.get_all_user_places(user)
+        for match, group_ids in peer_groups(snapshot, user):
+            got = index.get_recommendations_from_pipeline(index.ObjectId(user_id), match, visited, top_n=TOP_N)
+            others = [i for i in group_ids if i != user_id]
+            scores = index.group_place_scores(others, snapshot.trips_df, ChainMap({}, snapshot.user_docs)) if others else {}
+            # The pipeline breaks ties by name; MongoDB may sum a place's points in another order
+            expected = sorted(
+                ((place, score) for place, score in scores.items() if place and place not in visited),
+                key=lambda item: (-round(item[1], 9), item[0]),
+            )[:TOP_N]
+            assert not set(got) & visited
+            assert [round(scores.get(place, -1.0), 9) for place in got] == [round(s, 9) for _, s in expected], (
+                user_id, match, got, expected
+            )
+            checked += 1
+    assert checked > 100
+
+
+def test_pipeline_mode_serves_recommendations(snapshot, monkeypatch):
+    monkeypatch.setattr(index, "QUERY_MODE", "pipeline")
+    client = index.app.test_client()
+    for user_id in list(snapshot.user_docs)[:10]:
+        response = client.get(f"/recommend_cities?id={user_id}")
+        assert response.status_code == 200
+        sections = response.get_json()["user"]["recommendations"]
+        assert set(sections) == {"based_on_similar_age_group", "based_on_co_visitation", "based_on_same_city"}
+        visited = index.get_all_user_places(index.get_user_by_id(user_id))
+        assert not visited & {place for places in sections.values() for place in places}
+    assert client.get(f"/recommend_cities?id={'0' * 24}").status_code == 404
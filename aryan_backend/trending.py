@@ -0,0 +1,260 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Trips in the last window days are the current period, the window before it the previous one
+DEFAULT_WINDOWS = (30, 90, 365)
+# A trip's weight halves every window * HALF_LIFE_FRACTION days of age
+HALF_LIFE_FRACTION = 0.25
+AGE_BAND_YEARS = 10
+# Weights are stored relative to a reference day; rebased once the clock is this many half-lives past it
+REBASE_HALF_LIVES = 256
+
+
+def today_day():
+    return int(np.datetime64('today', 'D').astype(np.int64))
+
+
+class TrendingCounters:
+    """
+    Time-bucketed trip counters for the places rising fastest over each window.
+    - the clock is the latest trip day seen (never past today), so windows end at the
+      data's newest trip rather than the wall clock; it advances as newer trips arrive
+    - trips are kept in day buckets; when the clock advances, buckets leaving the current
+      window move to the previous one and buckets leaving both are evicted, so the cost
+      follows the days advanced, not the trips held
+    - per facet (everyone, a city, an age band, a city and age band), window and period,
+      place sums of the decay weights 2 ** (-age / half_life) (stored relative to a
+      reference day, so an older bucket needs no rescaling as the clock moves) and trip counts
+    A place's trend is its decayed current-period weight minus the previous period's,
+    aged from the start of that period, so steady places score about zero and places
+    gaining trips score above it. rank() reads one row per period: O(places).
+    """
+
+    def __init__(self, windows=DEFAULT_WINDOWS, half_life_fraction=HALF_LIFE_FRACTION, age_band_years=AGE_BAND_YEARS):
+        self.windows = tuple(sorted(int(w) for w in windows))
+        if not self.windows or self.windows[0] <= 0:
+            raise ValueError("windows must be positive numbers of days")
+        self.half_lives = np.asarray(self.windows, dtype=float) * half_life_fraction
+        self.age_band_years = age_band_years
+        self.place_names = []
+        self.code_of_place = {}
+        # Position of each place code in name order, for ties
+        self._name_rank = np.zeros(0, dtype=np.int64)
+        self.facet_of_key = {}
+        self.clock = None
+        self.ref_day = None
+        # [facet, window, period (0 current, 1 previous), place]
+        self.weights = np.zeros((0, len(self.windows), 2, 0))
+        self.counts = np.zeros((0, len(self.windows), 2, 0), dtype=np.int64)
+        # day -> (facet ids, place codes), one entry per trip and facet
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # For stored snapshots: the lock does not pickle, an unpickled copy gets its own
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, places, days, dated, cities, ages, **options):
+        counters = cls(**options)
+        counters.add_trips(places, days, dated, cities, ages)
+        return counters
+
+    def band_label(self, band):
+        return f"{band}-{band + self.age_band_years - 1}"
+
+    def parse_band(self, label):
+        """Band lower bound from a "20-29" label; raises ValueError for anything else."""
+        try:
+            lo, hi = (int(part) for part in label.split("-"))
+        except ValueError:
+            raise ValueError(f"age_band must look like 0-{self.age_band_years - 1}")
+        if lo < 0 or lo % self.age_band_years or hi != lo + self.age_band_years - 1:
+            raise ValueError(f"age_band must look like 0-{self.age_band_years - 1}")
+        return lo
+
+    @property
+    def as_of(self):
+        return None if self.clock is None else str(np.datetime64(self.clock, 'D'))
+
+    def _grow(self, n_facets, n_places):
+        f, w, p, n = self.weights.shape
+        if n_facets <= f and n_places <= n:
+            return
+        n_facets, n_places = max(n_facets, f), max(n_places, n)
+        weights = np.zeros((n_facets, w, p, n_places))
+        counts = np.zeros((n_facets, w, p, n_places), dtype=np.int64)
+        weights[:f, :, :, :n] = self.weights
+        counts[:f, :, :, :n] = self.counts
+        self.weights, self.counts = weights, counts
+
+    def _codes(self, places):
+        codes, names = pd.factorize(np.asarray(places, dtype=object))
+        own = np.empty(len(names), dtype=np.int64)
+        for i, name in enumerate(names):
+            code = self.code_of_place.get(name)
+            if code is None:
+                code = self.code_of_place[name] = len(self.place_names)
+                self.place_names.append(name)
+            own[i] = code
+        if len(self._name_rank) < len(self.place_names):
+            self._name_rank = np.empty(len(self.place_names), dtype=np.int64)
+            self._name_rank[np.argsort(np.asarray(self.place_names, dtype=str), kind="stable")] = np.arange(len(self.place_names))
+        return own[codes]
+
+    def _facets(self, cities, bands):
+        """(trip index, facet id) pairs: every trip counts for all, its city, its band and both."""
+        city_codes, city_names = pd.factorize(np.asarray(cities, dtype=object))
+        trip_ids, facet_ids = [], []
+        for city_key, band_key in ((False, False), (True, False), (False, True), (True, True)):
+            keep = np.ones(len(bands), dtype=bool)
+            if city_key:
+                keep &= city_codes >= 0
+            if band_key:
+                keep &= bands >= 0
+            trips = np.flatnonzero(keep)
+            city = city_codes[trips] if city_key else np.full(len(trips), -1)
+            band = bands[trips] if band_key else np.full(len(trips), -1)
+            # One integer per (city, band) pair, -1 meaning any
+            span = int(bands.max(initial=-1)) + 2
+            unique, inverse = np.unique((city + 1) * span + band + 1, return_inverse=True)
+            ids = np.empty(len(unique), dtype=np.int64)
+            for i, pair in enumerate(unique.tolist()):
+                city_code, band_key = divmod(pair, span)
+                key = (city_names[city_code - 1] if city_code else None, band_key - 1 if band_key else None)
+                ids[i] = self.facet_of_key.setdefault(key, len(self.facet_of_key))
+            trip_ids.append(trips)
+            facet_ids.append(ids[inverse])
+        return np.concatenate(trip_ids), np.concatenate(facet_ids)
+
+    @staticmethod
+    def _period(days, window, clock):
+        """0 for days in the current period of window at clock, 1 in the previous one, 2 older."""
+        age = clock - days
+        return np.where(age < window, 0, np.where(age < 2 * window, 1, 2))
+
+    def _apply(self, facets, codes, days, periods, w, sign):
+        """Adds (sign 1) or removes (sign -1) trips of periods 0/1 to window w's sums."""
+        kept = periods < 2
+        facets, codes, days, periods = facets[kept], codes[kept], days[kept], periods[kept]
+        if len(days) == 0:
+            return
+        # The previous period is aged from its own end, one window later
+        weights = np.exp2((days + periods * self.windows[w] - self.ref_day) / self.half_lives[w])
+        window = np.full(len(days), w)
+        np.add.at(self.weights, (facets, window, periods, codes), sign * weights)
+        np.add.at(self.counts, (facets, window, periods, codes), sign)
+
+    def _advance(self, day):
+        if self.clock is None:
+            self.clock = self.ref_day = day
+            return
+        if day <= self.clock:
+            return
+        old_clock = self.clock
+        longest = self.windows[-1]
+        moved = [d for d in self._buckets if d > old_clock - 2 * longest and d <= day - self.windows[0]]
+        for d in moved:
+            facets, codes = self._buckets[d]
+            days = np.full(len(codes), d)
+            for w, window in enumerate(self.windows):
+                before = self._period(days, window, old_clock)
+                after = self._period(days, window, day)
+                if before[0] != after[0]:
+                    self._apply(facets, codes, days, before, w, -1)
+                    self._apply(facets, codes, days, after, w, 1)
+        self.clock = day
+        for d in [d for d in self._buckets if d <= day - 2 * longest]:
+            del self._buckets[d]
+        # Removals leave rounding residue where no trips remain
+        self.weights[self.counts == 0] = 0.0
+        if (self.clock - self.ref_day) / self.half_lives[0] > REBASE_HALF_LIVES:
+            shift = np.exp2((self.ref_day - self.clock) / self.half_lives)
+            self.weights *= shift[None, :, None, None]
+            self.ref_day = self.clock
+
+    def add_trips(self, places, days, dated, cities, ages):
+        """
+        Counts trips: normalized places, days and whether dated, plus their users' normalized
+        cities ("" or None when unknown) and ages (NaN when unknown). Undated trips, trips
+        after today and trips older than twice the longest window are not counted.
+        """
+        places = np.asarray(places, dtype=object)
+        days = np.asarray(days, dtype=np.int64)
+        keep = np.asarray(dated, dtype=bool) & (days <= today_day()) & (places != "")
+        if not keep.any():
+            return
+        places, days = places[keep], days[keep]
+        cities = np.asarray(cities, dtype=object)[keep]
+        cities = np.where(pd.isna(cities) | (cities == ""), None, cities)
+        ages = np.asarray(ages, dtype=float)[keep]
+        bands = np.where(ages >= 0, ages // self.age_band_years * self.age_band_years, -1).astype(np.int64)
+        with self._lock:
+            self._advance(int(days.max()))
+            recent = self.clock - days < 2 * self.windows[-1]
+            if not recent.any():
+                return
+            codes = self._codes(places[recent])
+            trips, facets = self._facets(cities[recent], bands[recent])
+            codes, days = codes[trips], days[recent][trips]
+            self._grow(len(self.facet_of_key), len(self.place_names))
+            for w, window in enumerate(self.windows):
+                self._apply(facets, codes, days, self._period(days, window, self.clock), w, 1)
+            order = np.argsort(days, kind="stable")
+            starts = np.flatnonzero(np.r_[True, np.diff(days[order]) != 0])
+            for group in np.split(order, starts[1:]):
+                d = int(days[group[0]])
+                old = self._buckets.get(d)
+                bucket = (facets[group], codes[group])
+                if old is not None:
+                    bucket = (np.concatenate([old[0], bucket[0]]), np.concatenate([old[1], bucket[1]]))
+                self._buckets[d] = bucket
+
+    def rank(self, window, city=None, age_band=None, top_n=10):
+        """
+        Places rising fastest over the last `window` days (one of the windows) among trips of
+        users in the city and/or age band, as {place, score, trips, previous_trips}, highest first.
+        """
+        w = self.windows.index(window)
+        with self._lock:
+            facet = self.facet_of_key.get((city or None, age_band))
+            if facet is None or self.clock is None:
+                return []
+            scale = np.exp2((self.ref_day - self.clock) / self.half_lives[w])
+            current, previous = self.weights[facet, w] * scale
+            trips, previous_trips = self.counts[facet, w].copy()
+            name_rank = self._name_rank
+        trend = current - previous
+        candidates = np.flatnonzero((trips > 0) & (trend > 1e-9))
+        # Highest trend, then more trips, then name
+        order = np.lexsort((name_rank[candidates], -trips[candidates], -trend[candidates]))
+        ranked = candidates[order[:top_n]].tolist()
+        return [
+            {
+                "place": self.place_names[code],
+                "score": round(float(trend[code]), 4),
+                "trips": int(trips[code]),
+                "previous_trips": int(previous_trips[code]),
+            }
+            for code in ranked
+        ]
+
+    def report(self, windows=None, city=None, age_band=None, top_n=10):
+        """JSON-ready rankings for each of `windows` (default all) in one facet."""
+        return {
+            "as_of": self.as_of,
+            "city": city,
+            "age_band": None if age_band is None else self.band_label(age_band),
+            "windows": {
+                str(window): self.rank(window, city, age_band, top_n)
+                for window in (self.windows if windows is None else windows)
+            },
+        }